@@ -0,0 +1,329 @@
+"""Offline load test of /api/dashboard and /api/mental-health/* against fake upstreams.
+
+Starts benchmarks/fake_upstreams.py and the app (uvicorn main:app) as
+subprocesses on local ports, with every store in a temporary directory.
+Sessions for ``--users`` users are written straight into the SQLite
+session store. ``--concurrency`` clients then send requests picked from
+``--mix`` for ``--duration`` seconds, after ``--warmup`` seconds whose
+results are discarded. Reported per endpoint: requests, errors, RPS and
+p50/p95/p99 latency, plus the app's resident memory before and at peak.
+
+Like real Google credentials, every seeded user shares one client_id and
+differs only in their tokens. After the run each session is loaded once
+more and must still hold its own Spotify token; the script exits non-zero
+if any session picked up another user's token.
+
+    python benchmarks/dashboard_load.py --users 50 --concurrency 32 --duration 30 \\
+        --latency-ms 80 --error-rate 0.01 --json results.json
+
+Keep the --json output of each release to compare them.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+from database.session_store import SQLiteSessionStore  # noqa: E402
+from services.google_auth import user_key  # noqa: E402
+from services.spotify_tokens import session_token_key  # noqa: E402
+
+SESSION_COOKIE = "session_id"
+# The app's Google OAuth client id, the same in every user's credentials
+CLIENT_ID = "load-test-client"
+ENDPOINTS = ("dashboard", "dashboard_summary", "conditions", "medications", "add_medication")
+DEFAULT_MIX = "dashboard:6,dashboard_summary:2,conditions:1,medications:2,add_medication:1"
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _pids(pid: int) -> List[int]:
+    """``pid`` and its descendants (uvicorn workers)"""
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            return [pid] + [descendant for child in children.read().split() for descendant in _pids(int(child))]
+    except OSError:
+        return [pid]
+
+
+def rss_mb(pid: int) -> Optional[float]:
+    """Resident set size of a process and its workers in MB (Linux only)"""
+    total = 0
+    for process in _pids(pid):
+        try:
+            with open(f"/proc/{process}/status") as status:
+                total += next(int(line.split()[1]) for line in status if line.startswith("VmRSS:"))
+        except (OSError, StopIteration):
+            if process == pid:
+                return None
+    return total / 1024
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    if not sorted_values:
+        return float("nan")
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def seed_sessions(store: SQLiteSessionStore, users: int, upstream_url: str) -> List[str]:
+    """One logged-in session per user, with Google and Spotify tokens valid for a day"""
+    expiry = (datetime.utcnow() + timedelta(days=1)).isoformat()
+    session_ids = []
+    for user in range(users):
+        session_id = secrets.token_urlsafe(32)
+        credentials = {
+            "token": f"google-access-{user}",
+            "refresh_token": f"google-refresh-{user}",
+            "token_uri": f"{upstream_url}/google/token",
+            "client_id": CLIENT_ID,
+            "client_secret": "load-test",
+            "scopes": [],
+            "expiry": expiry,
+        }
+        store.save(session_id, {
+            "credentials": credentials,
+            session_token_key(user_key(credentials)): {
+                "access_token": f"spotify-access-{user}",
+                "refresh_token": f"spotify-refresh-{user}",
+                "expires_at": int(time.time()) + 86400,
+            },
+        }, 86400)
+        session_ids.append(session_id)
+    return session_ids
+
+
+async def wait_ready(url: str, process: subprocess.Popen, timeout: float = 30):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(url)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise RuntimeError(f"{url} did not start within {timeout}s")
+
+
+class LoadRun:
+    def __init__(self, app_url: str, session_ids: List[str], mix: Dict[str, int], app_pid: int):
+        self.app_url = app_url
+        self.session_ids = session_ids
+        self.names = list(mix)
+        self.weights = list(mix.values())
+        self.app_pid = app_pid
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.recording = False
+        self.peak_rss: Optional[float] = None
+
+    def request(self, client: httpx.AsyncClient, name: str, headers: dict):
+        if name == "dashboard":
+            return client.get("/api/dashboard", headers=headers)
+        if name == "dashboard_summary":
+            return client.get("/api/dashboard", params={"summary": "true"}, headers=headers)
+        if name == "conditions":
+            return client.get("/api/mental-health/conditions", headers=headers)
+        if name == "medications":
+            return client.get("/api/mental-health/medications", headers=headers)
+        if name == "add_medication":
+            return client.post("/api/mental-health/medications", headers=headers,
+                               json={"name": f"load-{random.randrange(10 ** 6)}", "dosage": "10mg"})
+        raise ValueError(name)
+
+    async def client(self, client: httpx.AsyncClient, stop_at: float):
+        while time.monotonic() < stop_at:
+            name = random.choices(self.names, self.weights)[0]
+            # An explicit Cookie header keeps the client's cookie jar out of it
+            headers = {"Cookie": f"{SESSION_COOKIE}={random.choice(self.session_ids)}"}
+            started = time.perf_counter()
+            try:
+                response = await self.request(client, name, headers)
+                failed = response.status_code >= 400
+            except httpx.HTTPError:
+                failed = True
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            if self.recording:
+                self.latencies[name].append(elapsed_ms)
+                if failed:
+                    self.errors[name] += 1
+
+    async def sample_memory(self, stop_at: float):
+        while time.monotonic() < stop_at:
+            rss = rss_mb(self.app_pid)
+            if rss is not None and self.recording:
+                self.peak_rss = max(self.peak_rss or 0.0, rss)
+            await asyncio.sleep(0.25)
+
+    async def run(self, concurrency: int, warmup: float, duration: float) -> float:
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=self.app_url, limits=limits, timeout=60) as client:
+            stop_at = time.monotonic() + warmup + duration
+            tasks = [asyncio.ensure_future(self.client(client, stop_at)) for _ in range(concurrency)]
+            tasks.append(asyncio.ensure_future(self.sample_memory(stop_at)))
+            await asyncio.sleep(warmup)
+            self.recording = True
+            started = time.monotonic()
+            await asyncio.gather(*tasks)
+            return time.monotonic() - started
+
+
+async def check_isolation(app_url: str, store: SQLiteSessionStore, session_ids: List[str]) -> List[int]:
+    """Users whose session no longer holds their own Spotify token after a dashboard load"""
+    async with httpx.AsyncClient(base_url=app_url, timeout=60) as client:
+        for session_id in session_ids:
+            await client.get("/api/dashboard", headers={"Cookie": f"{SESSION_COOKIE}={session_id}"})
+
+    mixed_up = []
+    for user, session_id in enumerate(session_ids):
+        data = store.load(session_id) or {}
+        token = data.get(session_token_key(user_key(data.get("credentials", {}))), {})
+        if token.get("access_token") != f"spotify-access-{user}":
+            mixed_up.append(user)
+    return mixed_up
+
+
+def parse_mix(mix: str) -> Dict[str, int]:
+    weights = {}
+    for part in mix.split(","):
+        name, _, weight = part.partition(":")
+        if name.strip() not in ENDPOINTS:
+            raise SystemExit(f"Unknown endpoint in --mix: {name} (choose from {', '.join(ENDPOINTS)})")
+        weights[name.strip()] = int(weight or 1)
+    return weights
+
+
+def report(run: LoadRun, elapsed: float, rss_before: Optional[float]) -> Dict:
+    results = {"elapsed_s": round(elapsed, 2), "endpoints": {}}
+    print(f"{'endpoint':<20}{'requests':>10}{'errors':>8}{'rps':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}")
+    rows = list(run.latencies.items()) + [("total", [v for values in run.latencies.values() for v in values])]
+    for name, values in rows:
+        values = sorted(values)
+        errors = sum(run.errors.values()) if name == "total" else run.errors[name]
+        row = {
+            "requests": len(values),
+            "errors": errors,
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 0.50), 1),
+            "p95_ms": round(percentile(values, 0.95), 1),
+            "p99_ms": round(percentile(values, 0.99), 1),
+        }
+        results["endpoints"][name] = row
+        print(f"{name:<20}{row['requests']:>10}{row['errors']:>8}{row['rps']:>9}"
+              f"{row['p50_ms']:>9}{row['p95_ms']:>9}{row['p99_ms']:>9}")
+
+    results["rss_mb"] = {"before": rss_before, "peak": run.peak_rss}
+    if rss_before is not None:
+        print(f"app RSS: {rss_before:.1f} MB before, {run.peak_rss or rss_before:.1f} MB peak")
+    else:
+        print("app RSS: not available on this platform")
+    return results
+
+
+async def main_async(args) -> int:
+    workdir = tempfile.mkdtemp(prefix="dashboard-load-")
+    upstream_port, app_port = free_port(), free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    app_url = f"http://127.0.0.1:{app_port}"
+
+    env = dict(
+        os.environ,
+        GOOGLE_FIT_API_URL=f"{upstream_url}/fitness/v1",
+        SPOTIFY_API_URL=f"{upstream_url}/v1",
+        SPOTIFY_ACCOUNTS_URL=f"{upstream_url}/accounts",
+        SESSION_BACKEND="sqlite",
+        SESSION_DB_PATH=os.path.join(workdir, "sessions.db"),
+        FITNESS_DB_PATH=os.path.join(workdir, "fitness.db"),
+        MENTAL_HEALTH_DB_PATH=os.path.join(workdir, "mental_health.db"),
+        HTTP2="false",
+    )
+    session_store = SQLiteSessionStore(env["SESSION_DB_PATH"])
+    session_ids = seed_sessions(session_store, args.users, upstream_url)
+    session_store.close()
+
+    upstream = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT, "benchmarks", "fake_upstreams.py"), "--port", str(upstream_port),
+         "--latency-ms", str(args.latency_ms), "--jitter-ms", str(args.jitter_ms),
+         "--error-rate", str(args.error_rate), "--rate-limit-rate", str(args.rate_limit_rate)],
+        cwd=ROOT
+    )
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning",
+         "--workers", str(args.workers)],
+        cwd=ROOT, env=env, stdout=None if args.verbose else subprocess.DEVNULL
+    )
+    try:
+        await wait_ready(f"{upstream_url}/stats", upstream)
+        await wait_ready(f"{app_url}/docs", app)
+        rss_before = rss_mb(app.pid)
+
+        print(f"users={args.users} concurrency={args.concurrency} duration={args.duration}s warmup={args.warmup}s "
+              f"latency={args.latency_ms}±{args.jitter_ms}ms errors={args.error_rate} 429s={args.rate_limit_rate}")
+        run = LoadRun(app_url, session_ids, parse_mix(args.mix), app.pid)
+        elapsed = await run.run(args.concurrency, args.warmup, args.duration)
+        results = report(run, elapsed, rss_before)
+
+        async with httpx.AsyncClient() as client:
+            results["upstream_calls"] = (await client.get(f"{upstream_url}/stats")).json()["calls"]
+        print(f"upstream calls: {results['upstream_calls']}")
+
+        session_store = SQLiteSessionStore(env["SESSION_DB_PATH"])
+        try:
+            mixed_up = await check_isolation(app_url, session_store, session_ids)
+        finally:
+            session_store.close()
+        results["sessions_with_foreign_token"] = len(mixed_up)
+
+        if args.json:
+            results["config"] = vars(args)
+            with open(args.json, "w") as f:
+                json.dump(results, f, indent=2)
+        if mixed_up:
+            print(f"FAIL: {len(mixed_up)} of {len(session_ids)} sessions hold another user's Spotify token")
+            return 1
+        print("OK: every session kept its own Spotify token")
+        return 0
+    finally:
+        for process in (app, upstream):
+            process.terminate()
+            process.wait(timeout=10)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=20, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="seconds before measuring")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="endpoint:weight pairs")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app")
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--verbose", action="store_true", help="show the app's output")
+    return asyncio.run(main_async(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
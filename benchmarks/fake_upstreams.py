@@ -0,0 +1,197 @@
+"""Local stand-ins for the Google Fit and Spotify APIs, for offline load tests.
+
+Serves the endpoints the app calls, with synthetic data that is stable per
+access token:
+
+    POST /fitness/v1/users/me/dataset:aggregate   Google Fit day buckets
+    POST /google/token                            Google token refresh
+    GET  /v1/me/player/currently-playing          Spotify now playing
+    GET  /v1/me/player/recently-played            honours the ``after`` cursor
+    GET  /v1/audio-features                       up to 100 ids
+    POST /accounts/api/token                      Spotify token refresh
+
+Every response is delayed by ``--latency-ms`` +/- ``--jitter-ms``. A
+``--error-rate`` share of calls answers 500, and a ``--rate-limit-rate``
+share of Spotify calls answers 429 with Retry-After: 1.
+
+    python benchmarks/fake_upstreams.py --port 8900 --latency-ms 80 --error-rate 0.01
+
+Point the app at it with GOOGLE_FIT_API_URL=http://127.0.0.1:8900/fitness/v1,
+SPOTIFY_API_URL=http://127.0.0.1:8900/v1 and
+SPOTIFY_ACCOUNTS_URL=http://127.0.0.1:8900/accounts.
+"""
+import argparse
+import asyncio
+import random
+import time
+import zlib
+from datetime import datetime, timezone
+from typing import Optional
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+DAY_MS = 86400000
+TRACK_MS = 200000
+
+
+class Faults:
+    """Latency and error injection shared by every endpoint"""
+
+    def __init__(self, latency_ms: float, jitter_ms: float, error_rate: float, rate_limit_rate: float, seed: Optional[int]):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.random = random.Random(seed)
+        self.calls = 0
+
+    async def apply(self, rate_limited: bool = False) -> Optional[Response]:
+        """Sleep for the injected latency; a failure response to send instead, if any"""
+        self.calls += 1
+        delay = self.latency_ms + self.random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            await asyncio.sleep(delay / 1000)
+        roll = self.random.random()
+        if roll < self.error_rate:
+            return JSONResponse({"error": "injected failure"}, status_code=500)
+        if rate_limited and roll < self.error_rate + self.rate_limit_rate:
+            return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": "1"})
+        return None
+
+
+def _rng(request: Request, *salt) -> random.Random:
+    """Deterministic per access token, so a user's data is stable across calls"""
+    token = request.headers.get("authorization", "")
+    return random.Random(zlib.crc32("|".join([token, *map(str, salt)]).encode()))
+
+
+def _track(rng: random.Random) -> dict:
+    number = rng.randrange(500)
+    return {
+        "id": f"track{number:04d}",
+        "name": f"Track {number}",
+        "artists": [{"name": f"Artist {number % 40}"}],
+        "album": {"name": f"Album {number % 80}", "images": [{"url": f"https://i.example/{number}.jpg"}]},
+        "duration_ms": TRACK_MS,
+    }
+
+
+def _day_bucket(rng: random.Random, start_ms: int) -> dict:
+    sleep_start = (start_ms + 2 * 3600 * 1000) * 1000000
+    sleep_points = []
+    for _ in range(rng.randint(4, 10)):
+        length = rng.randint(10, 90) * 60 * 1000000000
+        sleep_points.append({
+            "startTimeNanos": str(sleep_start),
+            "endTimeNanos": str(sleep_start + length),
+            "value": [{"intVal": rng.choice((1, 4, 4, 5, 6))}],
+        })
+        sleep_start += length
+    return {
+        "startTimeMillis": str(start_ms),
+        "endTimeMillis": str(start_ms + DAY_MS),
+        "dataset": [
+            {"dataSourceId": "derived:com.google.step_count.delta:com.google.android.gms:aggregated",
+             "point": [{"value": [{"intVal": rng.randint(1500, 15000)}]}]},
+            {"dataSourceId": "derived:com.google.heart_rate.summary:com.google.android.gms:aggregated",
+             "point": [{"value": [{"fpVal": rng.uniform(55, 95)}, {"fpVal": 120.0}, {"fpVal": 50.0}]}]},
+            {"dataSourceId": "derived:com.google.sleep.segment:com.google.android.gms:merged",
+             "point": sleep_points},
+        ],
+    }
+
+
+def create_app(faults: Faults) -> FastAPI:
+    app = FastAPI(title="Fake Google Fit and Spotify upstreams")
+    app.state.faults = faults
+
+    @app.post("/fitness/v1/users/me/dataset:aggregate")
+    async def aggregate(request: Request):
+        failure = await faults.apply()
+        if failure:
+            return failure
+        body = await request.json()
+        start, end = int(body["startTimeMillis"]), int(body["endTimeMillis"])
+        buckets = []
+        while start < end:
+            buckets.append(_day_bucket(_rng(request, start // DAY_MS), start))
+            start += DAY_MS
+        return {"bucket": buckets}
+
+    @app.post("/google/token")
+    async def google_token():
+        failure = await faults.apply()
+        if failure:
+            return failure
+        return {"access_token": f"google-{random.getrandbits(64):x}", "expires_in": 3600, "token_type": "Bearer"}
+
+    @app.post("/accounts/api/token")
+    async def spotify_token():
+        failure = await faults.apply()
+        if failure:
+            return failure
+        return {"access_token": f"spotify-{random.getrandbits(64):x}", "expires_in": 3600, "token_type": "Bearer"}
+
+    @app.get("/v1/me/player/currently-playing")
+    async def currently_playing(request: Request):
+        failure = await faults.apply(rate_limited=True)
+        if failure:
+            return failure
+        slot = int(time.time() * 1000) // TRACK_MS
+        rng = _rng(request, slot)
+        if rng.random() < 0.2:
+            return Response(status_code=204)
+        return {"is_playing": True, "progress_ms": int(time.time() * 1000) % TRACK_MS, "item": _track(rng)}
+
+    @app.get("/v1/me/player/recently-played")
+    async def recently_played(request: Request, limit: int = 50, after: Optional[int] = None):
+        failure = await faults.apply(rate_limited=True)
+        if failure:
+            return failure
+        slot = int(time.time() * 1000) // TRACK_MS
+        items = []
+        for offset in range(1, limit + 1):
+            played_ms = (slot - offset) * TRACK_MS
+            if after is not None and played_ms <= after:
+                break
+            played_at = datetime.fromtimestamp(played_ms / 1000, tz=timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.000Z')
+            items.append({"track": _track(_rng(request, slot - offset)), "played_at": played_at})
+        return {"items": items}
+
+    @app.get("/v1/audio-features")
+    async def audio_features(ids: str):
+        failure = await faults.apply(rate_limited=True)
+        if failure:
+            return failure
+        features = []
+        for track_id in ids.split(",")[:100]:
+            rng = random.Random(track_id)
+            features.append({"id": track_id, "valence": rng.random(), "energy": rng.random(), "tempo": rng.uniform(70, 170)})
+        return {"audio_features": features}
+
+    @app.get("/stats")
+    async def stats():
+        return {"calls": faults.calls}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--jitter-ms", type=float, default=20)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate, args.seed)
+    uvicorn.run(create_app(faults), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
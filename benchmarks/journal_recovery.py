@@ -0,0 +1,148 @@
+"""Crash-recovery checks for the journal storage backend.
+
+Each case damages or interrupts a journal the way a crash or a full disk
+would, reopens the store and checks what survived:
+
+    torn-json       last line cut mid-entry
+    torn-newline    last line complete JSON but missing its newline
+    append-after    a write after recovering from a torn line survives
+                    the next restart
+    failed-append   an append that fails is not visible in memory and
+                    is not persisted by the next compaction
+    compacted       snapshot plus journal replay after a compaction
+
+    python benchmarks/journal_recovery.py
+
+Exits non-zero if any case fails.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from typing import Callable, Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.journal import JournalStorage  # noqa: E402
+
+USER_ID = "recovery-user"
+KIND = "medications"
+
+
+def open_store(path: str) -> JournalStorage:
+    return JournalStorage(path, fsync=False, compact_interval=0)
+
+
+def ids(store: JournalStorage) -> List[str]:
+    return sorted(record['id'] for record in store.list_records(USER_ID, KIND))
+
+
+def crash(store: JournalStorage):
+    """Drop the store without the compaction close() would do"""
+    store._stop.set()
+    store._journal.close()
+
+
+def add(store: JournalStorage, record_id: str) -> bool:
+    return store.insert_record(USER_ID, KIND, {'id': record_id})
+
+
+def truncate_journal(path: str, keep: Callable[[bytes], bytes]):
+    with open(f"{path}.log", 'rb') as f:
+        data = f.read()
+    with open(f"{path}.log", 'wb') as f:
+        f.write(keep(data))
+
+
+def torn_json(path: str) -> List[str]:
+    store = open_store(path)
+    add(store, 'a')
+    add(store, 'b')
+    crash(store)
+    truncate_journal(path, lambda data: data[:-5])
+    return ids(open_store(path))
+
+
+def torn_newline(path: str) -> List[str]:
+    store = open_store(path)
+    add(store, 'a')
+    add(store, 'b')
+    crash(store)
+    truncate_journal(path, lambda data: data[:-1])
+    return ids(open_store(path))
+
+
+def append_after(path: str) -> List[str]:
+    store = open_store(path)
+    add(store, 'a')
+    add(store, 'b')
+    crash(store)
+    truncate_journal(path, lambda data: data[:-1])
+    store = open_store(path)
+    add(store, 'c')
+    crash(store)
+    return ids(open_store(path))
+
+
+def failed_append(path: str) -> List[str]:
+    store = open_store(path)
+    add(store, 'a')
+    write_batch = store._write_batch
+    store._write_batch = lambda lines: False
+    refused = add(store, 'b')
+    store._write_batch = write_batch
+    if refused or ids(store) != ['a']:
+        return ['b-visible']
+    store.compact()
+    crash(store)
+    return ids(open_store(path))
+
+
+def compacted(path: str) -> List[str]:
+    store = open_store(path)
+    add(store, 'a')
+    add(store, 'b')
+    store.compact()
+    add(store, 'c')
+    store.delete_record(USER_ID, KIND, 'a')
+    crash(store)
+    return ids(open_store(path))
+
+
+# Case name -> (run, ids expected after the final reopen)
+CASES: Dict[str, tuple] = {
+    "torn-json": (torn_json, ['a']),
+    "torn-newline": (torn_newline, ['a']),
+    "append-after": (append_after, ['a', 'c']),
+    "failed-append": (failed_append, ['a']),
+    "compacted": (compacted, ['b', 'c']),
+}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("cases", nargs="*", help=f"cases to run (default: all of {', '.join(CASES)})")
+    args = parser.parse_args()
+    unknown = set(args.cases) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    failed = False
+    for name in args.cases or CASES:
+        run, expected = CASES[name]
+        workdir = tempfile.mkdtemp(prefix="journal-recovery-")
+        try:
+            got = run(os.path.join(workdir, "journal.json"))
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        ok = got == expected
+        failed = failed or not ok
+        print(f"{name:<16}{'OK' if ok else 'FAIL'}  records={got} expected={expected}")
+
+    print("FAIL: journal recovery lost or resurrected writes" if failed else "OK: journal recovery")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,113 @@
+"""Lost-write stress test for MentalHealthDB across processes.
+
+Starts N worker processes (standing in for uvicorn workers), each running
+M client threads against one shared store. Every client adds medications
+and toggles a shared medication for the same user. Afterwards the totals
+are checked against storage and against each worker's cached view.
+
+    python benchmarks/mental_health_db_stress.py --workers 4 --clients 8 --ops 50
+
+Exits non-zero if any write was lost or any worker's cache is stale.
+The JSON backend is unversioned, so its workers run with the cache off.
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database.mental_health_db import MentalHealthDB  # noqa: E402
+from database.storage import create_storage  # noqa: E402
+from models.mental_health import MedicationCreate  # noqa: E402
+
+USER_ID = "stress-user"
+
+
+def open_db(backend: str, path: str) -> MentalHealthDB:
+    storage = create_storage(backend, path, legacy_json_path=None)
+    return MentalHealthDB(storage, cache_size=None if storage.versioned else 0)
+
+
+def worker(worker_id: int, args, path: str, shared_id: str, start_barrier, done_barrier, results):
+    db = open_db(args.backend, path)
+    # Warm the cache so stale entries would be visible at the end.
+    db.get_medications(USER_ID)
+
+    def client(client_id: int):
+        for op in range(args.ops):
+            db.add_medication(USER_ID, MedicationCreate(name=f"w{worker_id}-c{client_id}-{op}"))
+            db.toggle_medication(USER_ID, shared_id)
+            db.get_medications(USER_ID)
+
+    start_barrier.wait()
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(args.clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    done_barrier.wait()
+    medications = db.get_medications(USER_ID)
+    shared = next(m for m in medications if m.id == shared_id)
+    results.put((worker_id, len(medications), shared.active))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--clients", type=int, default=8)
+    parser.add_argument("--ops", type=int, default=25, help="adds + toggles per client")
+    parser.add_argument("--backend", default="sqlite", choices=["sqlite", "json"])
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="mh-stress-")
+    path = os.path.join(workdir, "stress.db" if args.backend == "sqlite" else "stress.json")
+
+    db = open_db(args.backend, path)
+    shared_id = db.add_medication(USER_ID, MedicationCreate(name="shared")).id
+
+    ctx = multiprocessing.get_context("spawn")
+    start_barrier = ctx.Barrier(args.workers + 1)
+    done_barrier = ctx.Barrier(args.workers)
+    results = ctx.Queue()
+    procs = [
+        ctx.Process(target=worker, args=(i, args, path, shared_id, start_barrier, done_barrier, results))
+        for i in range(args.workers)
+    ]
+    for p in procs:
+        p.start()
+
+    start_barrier.wait()
+    started = time.perf_counter()
+    worker_views = [results.get() for _ in procs]
+    elapsed = time.perf_counter() - started
+    for p in procs:
+        p.join()
+
+    total_toggles = args.workers * args.clients * args.ops
+    expected_count = 1 + total_toggles
+    expected_active = total_toggles % 2 == 0
+
+    stored = open_db(args.backend, path).storage.list_records(USER_ID, 'medications')
+    stored_active = next(m for m in stored if m['id'] == shared_id)['active']
+
+    print(f"backend={args.backend} workers={args.workers} clients={args.clients} ops={args.ops}")
+    print(f"{2 * total_toggles} writes in {elapsed:.2f}s ({2 * total_toggles / elapsed:.0f} writes/s)")
+    print(f"storage: {len(stored)}/{expected_count} medications, shared active={stored_active} (expected {expected_active})")
+
+    failed = len(stored) != expected_count or stored_active != expected_active
+    for worker_id, count, active in sorted(worker_views):
+        stale = count != expected_count or active != expected_active
+        failed = failed or stale
+        print(f"worker {worker_id} cache: {count} medications, shared active={active}{'  STALE' if stale else ''}")
+
+    print("FAIL: lost or stale writes" if failed else "OK: no lost writes")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""Serialization cost of dashboard and mental-health responses by payload size.
+
+Builds dashboard payloads for a range of windows (days of fitness points)
+and medication lists of growing length, then times each way of turning
+them into a response body:
+
+    default    jsonable_encoder + json.dumps, as FastAPI's JSONResponse does
+    validated  response_model re-validation of the models, then default
+    fast       services.responses.dumps (orjson when installed)
+    gzip / br  fast, then compressed as FastJSONResponse would
+
+    python benchmarks/serialization_bench.py --days 1 7 30 90 --repeat 200
+"""
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from models.fitness import SpotifyTrack  # noqa: E402
+from models.mental_health import Medication  # noqa: E402
+from models.timeseries import TimeSeries  # noqa: E402
+from services import responses  # noqa: E402
+
+
+def dashboard_payload(days: int) -> dict:
+    steps, heart_rate, sleep = TimeSeries.steps(), TimeSeries.heart_rate(), TimeSeries.sleep()
+    today = datetime.now()
+    for offset in range(days):
+        date = (today - timedelta(days=offset)).strftime('%Y-%m-%d')
+        steps.fill(date, [250 + i for i in range(24)])
+        heart_rate.fill(date, [60.0 + i / 10 for i in range(96)])
+        sleep.fill(date, [4, 5, 4, 6, 1, 4, 5, 6], [1800.0] * 8)
+    tracks = [SpotifyTrack(id=f"t{i}", name=f"Track {i}", artist="Artist", image="https://i.scdn.co/image/x",
+                           played_at=today.isoformat()) for i in range(5)]
+    return {
+        "step_data": steps.to_json(),
+        "heart_rate_data": heart_rate.to_json(),
+        "sleep_data": sleep.to_json(),
+        "calories_data": [],
+        "spotify_connected": True,
+        "current_track": tracks[0],
+        "recent_tracks": tracks,
+        "audio_summary": {"valence": 0.5, "energy": 0.6, "tempo": 118.0, "track_count": 5},
+        "mental_health": {"conditions": [], "medications": []},
+    }
+
+
+def medications_payload(count: int) -> list:
+    return [
+        Medication(id=str(uuid.uuid4()), created_at=datetime.now().isoformat(), name=f"Medication {i}",
+                   dosage="10mg", frequency="daily", started_date="2024-01-01", notes="with food")
+        for i in range(count)
+    ]
+
+
+def default_encode(content) -> bytes:
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, allow_nan=False,
+                      indent=None, separators=(',', ':')).encode()
+
+
+def revalidate_encode(content) -> bytes:
+    if isinstance(content, list):
+        content = [type(model)(**model.dict()) for model in content]
+    return default_encode(content)
+
+
+def timed(fn, content, repeat: int) -> float:
+    """Mean microseconds per call"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(content)
+    return (time.perf_counter() - started) / repeat * 1e6
+
+
+def report(label: str, content, repeat: int):
+    body = responses.dumps(content)
+    row = {
+        "default": timed(default_encode, content, repeat),
+        "validated": timed(revalidate_encode, content, repeat) if isinstance(content, list) else None,
+        "fast": timed(responses.dumps, content, repeat),
+        "gzip": timed(lambda c: gzip.compress(responses.dumps(c), compresslevel=responses.GZIP_LEVEL), content, repeat),
+        "br": timed(lambda c: responses.compress(responses.dumps(c), 'br'), content, repeat) if responses.brotli else None,
+    }
+    gzip_size = len(gzip.compress(body, compresslevel=responses.GZIP_LEVEL))
+    br_size = len(responses.compress(body, 'br')) if responses.brotli else None
+    cells = "".join(f"{value:>11.1f}" if value is not None else f"{'-':>11}" for value in row.values())
+    print(f"{label:<18}{len(body):>10}{gzip_size:>10}{br_size if br_size is not None else '-':>10}{cells}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 7, 30, 90])
+    parser.add_argument("--medications", type=int, nargs="+", default=[5, 50, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    print(f"json={'orjson' if responses.orjson else 'stdlib'} brotli={'yes' if responses.brotli else 'no'} "
+          f"repeat={args.repeat}; times in microseconds per response")
+    print(f"{'payload':<18}{'bytes':>10}{'gzip':>10}{'br':>10}"
+          + "".join(f"{name:>11}" for name in ("default", "validated", "fast", "gzip", "br")))
+    for days in args.days:
+        report(f"dashboard {days}d", dashboard_payload(days), args.repeat)
+    for count in args.medications:
+        report(f"medications {count}", medications_payload(count), args.repeat)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""Cold-start import time of the FastAPI app, checked against a budget.
+
+Imports ``main`` in fresh interpreters with ``-X importtime`` and reports
+the best total of ``--runs`` runs and the slowest top-level packages.
+Exits non-zero when the total exceeds ``--budget-ms``
+(STARTUP_IMPORT_BUDGET_MS, default 1500) or when a module that must load
+lazily (provider SDKs) is imported at startup, so it can gate CI.
+
+    python benchmarks/startup_time.py --runs 5 --top 15
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Only loaded on first use; importing any of them at startup fails the check
+LAZY_MODULES = ('google.oauth2', 'google.auth', 'googleapiclient', 'firebase_admin', 'requests')
+
+LINE = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def measure() -> Tuple[float, List[Tuple[str, int, int]]]:
+    """Total import time of ``main`` in ms and (module, self us, cumulative us) per module"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"importing main failed:\n{result.stderr[-2000:]}")
+
+    modules = []
+    total = 0
+    for line in result.stderr.splitlines():
+        match = LINE.match(line)
+        if not match:
+            continue
+        self_us, cumulative_us, indent, name = int(match[1]), int(match[2]), match[3], match[4]
+        modules.append((name, self_us, cumulative_us))
+        if name == "main" and len(indent) == 1:
+            # Everything main pulls in, without interpreter startup
+            total = cumulative_us
+    return total / 1000, modules
+
+
+def by_package(modules: List[Tuple[str, int, int]]) -> Dict[str, int]:
+    """Self time in us summed per top-level package"""
+    totals: Dict[str, int] = defaultdict(int)
+    for name, self_us, _ in modules:
+        totals[name.split('.')[0]] += self_us
+    return totals
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters; the fastest counts")
+    parser.add_argument("--top", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("STARTUP_IMPORT_BUDGET_MS", "1500")))
+    args = parser.parse_args()
+
+    runs = [measure() for _ in range(args.runs)]
+    total_ms, modules = min(runs, key=lambda run: run[0])
+
+    print(f"import main: {total_ms:.0f} ms (best of {args.runs}, budget {args.budget_ms:.0f} ms)")
+    print(f"{'package':<28}{'self ms':>10}")
+    for package, self_us in sorted(by_package(modules).items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{package:<28}{self_us / 1000:>10.1f}")
+
+    eager = sorted({name for name, _, _ in modules for lazy in LAZY_MODULES
+                    if name == lazy or name.startswith(lazy + '.')})
+    failed = False
+    if eager:
+        failed = True
+        print(f"FAIL: imported at startup but should load lazily: {', '.join(eager)}")
+    if total_ms > args.budget_ms:
+        failed = True
+        print(f"FAIL: startup imports took {total_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if not failed:
+        print("OK: within the startup budget")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+from services.fitness_cache import DailySummary, DayBucket
+from services.metrics import observe_storage
+
+
+class FitnessStore:
+    """SQLite store of synced Google Fit day buckets and per-user sync marks.
+
+    ``fitness_sync`` records, per user, the range of closed days
+    ``[earliest, high_water]`` that is fully present in ``fitness_days``.
+    ``fitness_summaries`` holds the materialized DailySummary of closed
+    days. Days are ``YYYY-MM-DD`` strings, which sort chronologically.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS fitness_days (
+            user_key TEXT NOT NULL,
+            day TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (user_key, day)
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS fitness_sync (
+            user_key TEXT PRIMARY KEY,
+            earliest TEXT NOT NULL,
+            high_water TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS fitness_summaries (
+            user_key TEXT NOT NULL,
+            day TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            PRIMARY KEY (user_key, day)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path or os.getenv("FITNESS_DB_PATH", "fitness_data.db")
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @observe_storage("fitness")
+    def get_sync_state(self, user_key: str) -> Tuple[Optional[str], Optional[str]]:
+        row = self._connect().execute(
+            "SELECT earliest, high_water FROM fitness_sync WHERE user_key = ?", (user_key,)
+        ).fetchone()
+        return (row[0], row[1]) if row else (None, None)
+
+    @observe_storage("fitness")
+    def save_days(self, user_key: str, days: Dict[str, DayBucket], earliest: str, high_water: str):
+        """Store closed days and widen the user's synced range in one transaction"""
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fitness_days (user_key, day, payload) VALUES (?, ?, ?)",
+                [
+                    (user_key, day, json.dumps(bucket.to_payload(), separators=(',', ':')))
+                    for day, bucket in days.items()
+                ]
+            )
+            conn.execute(
+                "INSERT INTO fitness_sync (user_key, earliest, high_water) VALUES (?, ?, ?) "
+                "ON CONFLICT (user_key) DO UPDATE SET "
+                "earliest = MIN(earliest, excluded.earliest), high_water = MAX(high_water, excluded.high_water)",
+                (user_key, earliest, high_water)
+            )
+
+    @observe_storage("fitness")
+    def load_days(self, user_key: str, days: Iterable[str]) -> Dict[str, DayBucket]:
+        days = sorted(days)
+        if not days:
+            return {}
+        rows = self._connect().execute(
+            "SELECT day, payload FROM fitness_days WHERE user_key = ? AND day BETWEEN ? AND ?",
+            (user_key, days[0], days[-1])
+        ).fetchall()
+        wanted = set(days)
+        return {
+            day: DayBucket.from_payload(day, json.loads(payload))
+            for day, payload in rows if day in wanted
+        }
+
+    @observe_storage("fitness")
+    def save_summaries(self, user_key: str, summaries: Dict[str, DailySummary]):
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO fitness_summaries (user_key, day, payload) VALUES (?, ?, ?)",
+                [
+                    (user_key, day, json.dumps(summary.to_payload(), separators=(',', ':')))
+                    for day, summary in summaries.items()
+                ]
+            )
+
+    @observe_storage("fitness")
+    def load_summaries(self, user_key: str, days: Iterable[str]) -> Dict[str, DailySummary]:
+        days = sorted(days)
+        if not days:
+            return {}
+        rows = self._connect().execute(
+            "SELECT day, payload FROM fitness_summaries WHERE user_key = ? AND day BETWEEN ? AND ?",
+            (user_key, days[0], days[-1])
+        ).fetchall()
+        wanted = set(days)
+        return {
+            day: DailySummary.from_payload(day, json.loads(payload))
+            for day, payload in rows if day in wanted
+        }
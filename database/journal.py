@@ -0,0 +1,294 @@
+import json
+import logging
+import os
+import threading
+from typing import Callable, Dict, List, Optional
+
+from database.storage import RECORD_KINDS, StorageBackend, fcntl
+
+logger = logging.getLogger(__name__)
+
+_COMPACT = (',', ':')
+
+
+class _Batch:
+    """Journal lines that will be written and fsynced together."""
+
+    __slots__ = ('lines', 'undo', 'done', 'ok')
+
+    def __init__(self):
+        self.lines: List[str] = []
+        self.undo: List[Callable[[], None]] = []
+        self.done = False
+        self.ok = False
+
+
+class JournalStorage(StorageBackend):
+    """In-memory store made durable by an append-only journal plus snapshots.
+
+    Every mutation is applied in memory and appended to ``<path>.log`` as one
+    compact JSON line; if the append fails the in-memory change is undone. Concurrent writers are group-committed: the first
+    writer to find no flush in progress writes and fsyncs every line queued
+    so far, and the others wait for that flush instead of issuing their own.
+    A background thread folds the journal into the ``<path>`` snapshot once
+    it holds ``compact_threshold`` operations. On startup the snapshot is
+    loaded and the journal replayed; a torn trailing line (unparseable or
+    missing its newline) is discarded.
+
+    Journal entries carry the resulting record rather than the operation
+    (``put`` / ``del`` / ``replace``), so replaying an entry twice is harmless.
+
+    State lives in one process: the journal is locked exclusively on open,
+    so a second worker fails fast instead of diverging. Multi-worker
+    deployments should use the SQLite backend.
+    """
+
+    def __init__(self, path: str = "mental_health_journal.json", fsync: bool = True,
+                 compact_threshold: int = 1000, compact_interval: float = 30.0):
+        self.snapshot_path = path
+        self.journal_path = f"{path}.log"
+        self.fsync = fsync
+        self.compact_threshold = compact_threshold
+        self.compact_interval = compact_interval
+
+        self._state: Dict[str, Dict[str, Dict[str, Dict]]] = {}
+        self._cond = threading.Condition()
+        self._io_lock = threading.Lock()
+        self._batch = _Batch()
+        self._flushing = False
+        self._journal_ops = 0
+
+        self._journal = open(self.journal_path, 'a', encoding='utf-8')
+        if fcntl is not None:
+            try:
+                fcntl.flock(self._journal, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                self._journal.close()
+                raise RuntimeError(
+                    f"{self.journal_path} is in use by another process; "
+                    "the journal backend is single-process, use MENTAL_HEALTH_DB_BACKEND=sqlite with multiple workers"
+                )
+        self._recover()
+
+        self._stop = threading.Event()
+        self._compactor: Optional[threading.Thread] = None
+        if compact_interval > 0:
+            self._compactor = threading.Thread(target=self._compact_loop, name="mental-health-journal-compactor", daemon=True)
+            self._compactor.start()
+
+    # Recovery
+
+    def _recover(self):
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, 'r', encoding='utf-8') as f:
+                for user_id, user_data in json.load(f).items():
+                    self._apply_replace(user_id, user_data)
+
+        if not os.path.exists(self.journal_path):
+            return
+
+        valid_bytes = 0
+        with open(self.journal_path, 'rb') as f:
+            for raw in f:
+                # Every acknowledged entry ends in a newline. A final line without
+                # one is torn even if it parses, and keeping it would glue the
+                # next append onto it.
+                try:
+                    if not raw.endswith(b"\n"):
+                        raise ValueError("missing newline")
+                    self._apply_entry(json.loads(raw))
+                except ValueError:
+                    logger.warning("Discarding torn journal entry", extra={"offset": valid_bytes, "path": self.journal_path})
+                    break
+                valid_bytes += len(raw)
+                self._journal_ops += 1
+
+        if valid_bytes != os.path.getsize(self.journal_path):
+            with open(self.journal_path, 'r+b') as f:
+                f.truncate(valid_bytes)
+
+    # In-memory state
+
+    def _user(self, user_id: str) -> Dict[str, Dict[str, Dict]]:
+        user = self._state.get(user_id)
+        if user is None:
+            user = self._state[user_id] = {kind: {} for kind in RECORD_KINDS}
+        return user
+
+    def _apply_replace(self, user_id: str, user_data: Dict):
+        self._state[user_id] = {
+            kind: {record['id']: record for record in user_data.get(kind, [])}
+            for kind in RECORD_KINDS
+        }
+
+    def _apply_entry(self, entry: list) -> Callable[[], None]:
+        """Apply ``entry`` and return a function that reverts it.
+
+        The revert leaves alone anything a later entry has changed since,
+        so undoing a failed batch never clobbers a newer write.
+        """
+        op, user_id = entry[0], entry[1]
+        previous_user = self._state.get(user_id)
+
+        if op == 'replace':
+            self._apply_replace(user_id, entry[2])
+            applied = self._state[user_id]
+
+            def undo():
+                if self._state.get(user_id) is applied:
+                    if previous_user is None:
+                        del self._state[user_id]
+                    else:
+                        self._state[user_id] = previous_user
+            return undo
+
+        user = self._user(user_id)
+        records = user[entry[2]]
+        record_id = entry[3]['id'] if op == 'put' else entry[3]
+        previous = records.get(record_id)
+        if op == 'put':
+            records[record_id] = entry[3]
+        else:
+            records.pop(record_id, None)
+        current = records.get(record_id)
+
+        def undo():
+            if self._state.get(user_id) is not user or records.get(record_id) is not current:
+                return
+            if previous is None:
+                records.pop(record_id, None)
+            else:
+                records[record_id] = previous
+            if previous_user is None and not any(user.values()):
+                del self._state[user_id]
+        return undo
+
+    # Group commit
+
+    def _commit(self, entry: list) -> bool:
+        """Apply ``entry`` and block until it is durable. Caller holds ``_cond``.
+
+        If the batch cannot be written, every entry in it is reverted so
+        readers and the next snapshot never see a write that was refused.
+        """
+        batch = self._batch
+        batch.undo.append(self._apply_entry(entry))
+        batch.lines.append(json.dumps(entry, separators=_COMPACT) + "\n")
+
+        while not batch.done:
+            if self._flushing:
+                self._cond.wait()
+                continue
+
+            self._flushing = True
+            self._batch = _Batch()
+            self._cond.release()
+            try:
+                batch.ok = self._write_batch(batch.lines)
+            finally:
+                self._cond.acquire()
+                self._flushing = False
+                batch.done = True
+                if batch.ok:
+                    self._journal_ops += len(batch.lines)
+                else:
+                    for undo in reversed(batch.undo):
+                        undo()
+                self._cond.notify_all()
+
+        return batch.ok
+
+    def _write_batch(self, lines: List[str]) -> bool:
+        try:
+            with self._io_lock:
+                self._journal.write("".join(lines))
+                self._journal.flush()
+                if self.fsync:
+                    os.fsync(self._journal.fileno())
+            return True
+        except OSError as e:
+            logger.error("Error appending to journal", extra={"error": str(e)})
+            return False
+
+    # Compaction
+
+    def _compact_loop(self):
+        while not self._stop.wait(self.compact_interval):
+            if self._journal_ops >= self.compact_threshold:
+                self.compact()
+
+    def compact(self) -> bool:
+        """Write the current state to the snapshot and truncate the journal."""
+        try:
+            with self._io_lock:
+                with self._cond:
+                    snapshot = json.dumps({
+                        user_id: {kind: list(records.values()) for kind, records in user.items()}
+                        for user_id, user in self._state.items()
+                    }, separators=_COMPACT)
+                    self._journal_ops = 0
+
+                tmp_path = f"{self.snapshot_path}.tmp"
+                with open(tmp_path, 'w', encoding='utf-8') as f:
+                    f.write(snapshot)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_path, self.snapshot_path)
+
+                self._journal.truncate(0)
+                self._journal.seek(0)
+            return True
+        except OSError as e:
+            logger.error("Error compacting journal", extra={"error": str(e)})
+            return False
+
+    # StorageBackend
+
+    def list_records(self, user_id: str, kind: str) -> List[Dict]:
+        with self._cond:
+            user = self._state.get(user_id)
+            return [dict(record) for record in user[kind].values()] if user else []
+
+    def get_user_data(self, user_id: str) -> Dict:
+        with self._cond:
+            user = self._state.get(user_id)
+            return {
+                kind: [dict(record) for record in user[kind].values()] if user else []
+                for kind in RECORD_KINDS
+            }
+
+    def replace_user_data(self, user_id: str, user_data: Dict, expected_version: Optional[int] = None) -> bool:
+        if expected_version is not None:
+            raise ValueError("Journal storage does not support versioned writes")
+        with self._cond:
+            return self._commit(['replace', user_id, {kind: user_data.get(kind, []) for kind in RECORD_KINDS}])
+
+    def insert_record(self, user_id: str, kind: str, record: Dict) -> bool:
+        with self._cond:
+            return self._commit(['put', user_id, kind, dict(record)])
+
+    def delete_record(self, user_id: str, kind: str, record_id: str) -> bool:
+        with self._cond:
+            if user_id not in self._state or record_id not in self._state[user_id][kind]:
+                return True
+            return self._commit(['del', user_id, kind, record_id])
+
+    def update_record(self, user_id: str, kind: str, record_id: str, mutate: Callable[[Dict], None]) -> bool:
+        with self._cond:
+            current = self._state.get(user_id, {}).get(kind, {}).get(record_id)
+            if current is None:
+                return True
+            record = dict(current)
+            mutate(record)
+            return self._commit(['put', user_id, kind, record])
+
+    def is_empty(self) -> bool:
+        with self._cond:
+            return not self._state
+
+    def close(self):
+        self._stop.set()
+        if self._compactor is not None:
+            self._compactor.join()
+        self.compact()
+        self._journal.close()
@@ -1,99 +1,255 @@
-import json
+import asyncio
 import os
+import threading
+import time
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Callable, Dict, List, Optional
 from models.mental_health import Condition, ConditionCreate, Medication, MedicationCreate
+from database.cache import LRUCache
+from database.storage import RECORD_KINDS, StorageBackend, create_storage
+from services.metrics import STORAGE_DURATION, STORAGE_QUEUE_WAIT
+
+MODEL_TYPES = {'conditions': Condition, 'medications': Medication}
+
+
+class _CachedUser:
+    """Raw records for one user plus the pydantic models built from them.
+
+    ``version`` is the storage version the records correspond to (None when
+    unknown or unversioned) and ``epoch`` the MentalHealthDB change epoch at
+    which that version was last confirmed.
+    """
+
+    __slots__ = ('records', 'models', 'version', 'epoch')
+
+    def __init__(self, records: Dict, version: Optional[int] = None, epoch: int = 0):
+        self.records = records
+        self.models: Dict[str, list] = {}
+        self.version = version
+        self.epoch = epoch
+
+    def apply(self, kind: str, change: Callable[[List[Dict]], List[Dict]], version: Optional[int]):
+        if version is not None and (self.version is None or version != self.version + 1):
+            # Someone else wrote in between; the next read reloads from storage.
+            self.version = None
+            return
+        self.records[kind] = change(self.records[kind])
+        self.models.pop(kind, None)
+        self.version = version
+
 
 class MentalHealthDB:
-    def __init__(self, file_path: str = "mental_health_data.json"):
-        self.file_path = file_path
-        self._ensure_file_exists()
+    def __init__(self, storage: Optional[StorageBackend] = None, cache_size: Optional[int] = None, cache_ttl: Optional[float] = None):
+        self.storage = storage or create_storage()
+        self.cache = LRUCache(
+            max_size=cache_size if cache_size is not None else int(os.getenv("MENTAL_HEALTH_CACHE_SIZE", "1024")),
+            ttl=cache_ttl if cache_ttl is not None else float(os.getenv("MENTAL_HEALTH_CACHE_TTL", "300"))
+        )
+        # With a versioned (shared) backend, other workers may write at any time.
+        # The storage change token moves whenever they do; each move bumps the
+        # epoch, and entries from an older epoch re-check their user's version.
+        self._epoch = 0
+        self._epoch_lock = threading.Lock()
+        self._local = threading.local()
+        # Writes per user, bumped together with the cache update. A fill only
+        # caches what it loaded if no write to that user landed during the
+        # load; otherwise the write may have found no entry to update and the
+        # fill would cache records older than storage.
+        self._writes: Dict[str, int] = {}
+        self._fill_lock = threading.Lock()
     
-    def _ensure_file_exists(self):
-        if not os.path.exists(self.file_path):
-            with open(self.file_path, 'w') as f:
-                json.dump({}, f)
+    def _current_epoch(self) -> int:
+        token = self.storage.change_token()
+        if getattr(self._local, 'token', None) != token:
+            self._local.token = token
+            with self._epoch_lock:
+                self._epoch += 1
+        return self._epoch
     
-    def _load_data(self) -> Dict:
-        try:
-            with open(self.file_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading data: {e}")
-            return {}
+    def _cached_user(self, user_id: str) -> _CachedUser:
+        cached = self.cache.get(user_id)
+        if self.storage.versioned:
+            epoch = self._current_epoch()
+            if cached is not None and (cached.version is None or cached.epoch != epoch):
+                if self.storage.user_version(user_id) == cached.version:
+                    cached.epoch = epoch
+                else:
+                    cached = None
+            if cached is None:
+                records, version = self.storage.get_user_data_versioned(user_id)
+                cached = _CachedUser(records, version, epoch)
+                self.cache.set(user_id, cached)
+        elif cached is None:
+            writes = self._writes.get(user_id, 0)
+            cached = _CachedUser(self.storage.get_user_data(user_id))
+            with self._fill_lock:
+                if self._writes.get(user_id, 0) == writes:
+                    self.cache.set(user_id, cached)
+        return cached
     
-    def _save_data(self, data: Dict) -> bool:
-        try:
-            with open(self.file_path, 'w') as f:
-                json.dump(data, f, indent=2)
-            return True
-        except Exception as e:
-            print(f"Error saving data: {e}")
-            return False
+    def _models(self, user_id: str, kind: str) -> list:
+        cached = self._cached_user(user_id)
+        models = cached.models.get(kind)
+        if models is None:
+            model = MODEL_TYPES[kind]
+            models = cached.models[kind] = [model(**record) for record in cached.records[kind]]
+        return list(models)
+    
+    def _record_write(self, user_id: str, update_cache: Callable[[], None]):
+        with self._fill_lock:
+            self._writes[user_id] = self._writes.get(user_id, 0) + 1
+            update_cache()
+
+    def _write_through(self, user_id: str, kind: str, change: Callable[[List[Dict]], List[Dict]]):
+        version = self.storage.last_write_version()
+        self._record_write(user_id, lambda: self.cache.update(user_id, lambda cached: cached.apply(kind, change, version)))
+    
+    def cache_stats(self) -> Dict:
+        return self.cache.stats()
     
     def get_user_data(self, user_id: str) -> Dict:
-        all_data = self._load_data()
-        return all_data.get(user_id, {'conditions': [], 'medications': []})
+        records = self._cached_user(user_id).records
+        return {kind: [dict(record) for record in records[kind]] for kind in RECORD_KINDS}
+    
+    def get_user_version(self, user_id: str) -> Optional[int]:
+        """Current storage version of a user, for optimistic ``save_user_data``."""
+        return self.storage.user_version(user_id)
     
-    def save_user_data(self, user_id: str, user_data: Dict) -> bool:
-        all_data = self._load_data()
-        all_data[user_id] = user_data
-        return self._save_data(all_data)
+    def save_user_data(self, user_id: str, user_data: Dict, expected_version: Optional[int] = None) -> bool:
+        success = self.storage.replace_user_data(user_id, user_data, expected_version)
+        if success:
+            cached = _CachedUser(
+                {kind: [dict(record) for record in user_data.get(kind, [])] for kind in RECORD_KINDS},
+                self.storage.last_write_version(),
+                self._epoch
+            )
+            self._record_write(user_id, lambda: self.cache.set(user_id, cached))
+        else:
+            self._record_write(user_id, lambda: self.cache.pop(user_id))
+        return success
     
     # Condition methods
     def get_conditions(self, user_id: str) -> List[Condition]:
-        user_data = self.get_user_data(user_id)
-        return [Condition(**condition) for condition in user_data['conditions']]
+        return self._models(user_id, 'conditions')
     
-    def add_condition(self, user_id: str, condition_data: ConditionCreate) -> Condition:
-        user_data = self.get_user_data(user_id)
+    def add_condition(self, user_id: str, condition_data: ConditionCreate) -> Optional[Condition]:
+        """The stored condition, or None if storage refused the write"""
         new_condition = Condition(
             id=str(uuid.uuid4()),
             created_at=datetime.now().isoformat(),
             **condition_data.dict()
         )
-        user_data['conditions'].append(new_condition.dict())
-        self.save_user_data(user_id, user_data)
+        record = new_condition.dict()
+        if not self.storage.insert_record(user_id, 'conditions', record):
+            return None
+        self._write_through(user_id, 'conditions', lambda records: records + [record])
         return new_condition
     
     def delete_condition(self, user_id: str, condition_id: str) -> bool:
-        user_data = self.get_user_data(user_id)
-        user_data['conditions'] = [
-            c for c in user_data['conditions'] if c['id'] != condition_id
-        ]
-        return self.save_user_data(user_id, user_data)
+        success = self.storage.delete_record(user_id, 'conditions', condition_id)
+        if success:
+            self._write_through(user_id, 'conditions', lambda records: [c for c in records if c['id'] != condition_id])
+        return success
     
     # Medication methods
     def get_medications(self, user_id: str) -> List[Medication]:
-        user_data = self.get_user_data(user_id)
-        return [Medication(**medication) for medication in user_data['medications']]
+        return self._models(user_id, 'medications')
     
-    def add_medication(self, user_id: str, medication_data: MedicationCreate) -> Medication:
-        user_data = self.get_user_data(user_id)
+    def add_medication(self, user_id: str, medication_data: MedicationCreate) -> Optional[Medication]:
+        """The stored medication, or None if storage refused the write"""
         new_medication = Medication(
             id=str(uuid.uuid4()),
             created_at=datetime.now().isoformat(),
             **medication_data.dict()
         )
-        user_data['medications'].append(new_medication.dict())
-        self.save_user_data(user_id, user_data)
+        record = new_medication.dict()
+        if not self.storage.insert_record(user_id, 'medications', record):
+            return None
+        self._write_through(user_id, 'medications', lambda records: records + [record])
         return new_medication
     
     def delete_medication(self, user_id: str, medication_id: str) -> bool:
-        user_data = self.get_user_data(user_id)
-        user_data['medications'] = [
-            m for m in user_data['medications'] if m['id'] != medication_id
-        ]
-        return self.save_user_data(user_id, user_data)
+        success = self.storage.delete_record(user_id, 'medications', medication_id)
+        if success:
+            self._write_through(user_id, 'medications', lambda records: [m for m in records if m['id'] != medication_id])
+        return success
     
     def toggle_medication(self, user_id: str, medication_id: str) -> bool:
-        user_data = self.get_user_data(user_id)
-        for medication in user_data['medications']:
-            if medication['id'] == medication_id:
-                medication['active'] = not medication.get('active', True)
-                break
-        return self.save_user_data(user_id, user_data)
-
-# Global database instance
-mental_health_db = MentalHealthDB()
\ No newline at end of file
+        def toggle(medication: Dict):
+            medication['active'] = not medication.get('active', True)
+
+        def toggle_cached(records: List[Dict]) -> List[Dict]:
+            records = [dict(m) for m in records]
+            for medication in records:
+                if medication['id'] == medication_id:
+                    toggle(medication)
+                    break
+            return records
+
+        success = self.storage.update_record(user_id, 'medications', medication_id, toggle)
+        if success:
+            self._write_through(user_id, 'medications', toggle_cached)
+        return success
+
+
+class AsyncMentalHealthDB:
+    """Awaitable facade over MentalHealthDB for use from async route handlers.
+
+    Every call runs on a bounded thread pool (``MENTAL_HEALTH_DB_POOL_SIZE``,
+    default 4) so storage I/O never blocks the event loop. The wait for a
+    worker and the time spent in each operation are recorded as metrics.
+    """
+
+    def __init__(self, db: MentalHealthDB, pool_size: Optional[int] = None):
+        self.db = db
+        self.pool_size = pool_size or int(os.getenv("MENTAL_HEALTH_DB_POOL_SIZE", "4"))
+        self._executor = ThreadPoolExecutor(max_workers=self.pool_size, thread_name_prefix="mental-health-db")
+
+    async def _run(self, fn: Callable, *args):
+        submitted = time.perf_counter()
+
+        def timed():
+            started = time.perf_counter()
+            STORAGE_QUEUE_WAIT.observe(started - submitted, "mental_health")
+            try:
+                return fn(*args)
+            finally:
+                STORAGE_DURATION.observe(time.perf_counter() - started, "mental_health", fn.__name__)
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, timed)
+
+    async def get_user_data(self, user_id: str) -> Dict:
+        return await self._run(self.db.get_user_data, user_id)
+
+    async def save_user_data(self, user_id: str, user_data: Dict, expected_version: Optional[int] = None) -> bool:
+        return await self._run(self.db.save_user_data, user_id, user_data, expected_version)
+
+    async def get_conditions(self, user_id: str) -> List[Condition]:
+        return await self._run(self.db.get_conditions, user_id)
+
+    async def add_condition(self, user_id: str, condition_data: ConditionCreate) -> Optional[Condition]:
+        return await self._run(self.db.add_condition, user_id, condition_data)
+
+    async def delete_condition(self, user_id: str, condition_id: str) -> bool:
+        return await self._run(self.db.delete_condition, user_id, condition_id)
+
+    async def get_medications(self, user_id: str) -> List[Medication]:
+        return await self._run(self.db.get_medications, user_id)
+
+    async def add_medication(self, user_id: str, medication_data: MedicationCreate) -> Optional[Medication]:
+        return await self._run(self.db.add_medication, user_id, medication_data)
+
+    async def delete_medication(self, user_id: str, medication_id: str) -> bool:
+        return await self._run(self.db.delete_medication, user_id, medication_id)
+
+    async def toggle_medication(self, user_id: str, medication_id: str) -> bool:
+        return await self._run(self.db.toggle_medication, user_id, medication_id)
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+# Global database instances
+mental_health_db = MentalHealthDB()
+async_mental_health_db = AsyncMentalHealthDB(mental_health_db)
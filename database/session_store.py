@@ -0,0 +1,122 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from database.cache import LRUCache
+from services.metrics import observe_storage
+
+
+class SessionStore:
+    """Server-side session data keyed by an opaque session id.
+
+    Sessions are stored as JSON, so values must be JSON-serializable, as
+    they had to be in the signed cookie. Expired sessions load as None.
+    Backends with ``blocking = True`` do I/O and are called off the event loop.
+    """
+
+    blocking = False
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def save(self, session_id: str, data: Dict, max_age: int):
+        raise NotImplementedError
+
+    def delete(self, session_id: str):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    """Per-process LRU of sessions; only valid with a single worker"""
+
+    def __init__(self, max_sessions: int = 10000, max_age: int = 14 * 24 * 3600):
+        self.cache = LRUCache(max_size=max_sessions, ttl=max_age)
+
+    def load(self, session_id: str) -> Optional[Dict]:
+        payload = self.cache.get(session_id)
+        return json.loads(payload) if payload is not None else None
+
+    def save(self, session_id: str, data: Dict, max_age: int):
+        self.cache.set(session_id, json.dumps(data, separators=(',', ':')))
+
+    def delete(self, session_id: str):
+        self.cache.pop(session_id)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions in a SQLite file shared by every worker on the host.
+
+    Expired rows are purged every ``purge_every`` saves.
+    """
+
+    blocking = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS sessions (
+            id TEXT PRIMARY KEY,
+            data TEXT NOT NULL,
+            expires_at REAL NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, db_path: str = "sessions.db", purge_every: int = 1000):
+        self.db_path = db_path
+        self.purge_every = purge_every
+        self._saves = 0
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @observe_storage("sessions")
+    def load(self, session_id: str) -> Optional[Dict]:
+        row = self._connect().execute(
+            "SELECT data FROM sessions WHERE id = ? AND expires_at > ?", (session_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    @observe_storage("sessions")
+    def save(self, session_id: str, data: Dict, max_age: int):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, expires_at) VALUES (?, ?, ?)",
+                (session_id, json.dumps(data, separators=(',', ':')), now + max_age)
+            )
+            self._saves += 1
+            if self._saves % self.purge_every == 0:
+                conn.execute("DELETE FROM sessions WHERE expires_at <= ?", (now,))
+
+    @observe_storage("sessions")
+    def delete(self, session_id: str):
+        with self._connect() as conn:
+            conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def close(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+
+def create_session_store(backend: str = None, max_age: int = 14 * 24 * 3600) -> SessionStore:
+    """Build the configured store (``SESSION_BACKEND``: memory | sqlite)"""
+    backend = (backend or os.getenv("SESSION_BACKEND", "memory")).lower()
+    if backend == "memory":
+        return MemorySessionStore(int(os.getenv("SESSION_CACHE_SIZE", "10000")), max_age)
+    if backend == "sqlite":
+        return SQLiteSessionStore(os.getenv("SESSION_DB_PATH", "sessions.db"))
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,397 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory locks, single-process use only
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+RECORD_KINDS = ('conditions', 'medications')
+
+
+def empty_user_data() -> Dict:
+    return {kind: [] for kind in RECORD_KINDS}
+
+
+class StorageBackend:
+    """Per-user record store behind MentalHealthDB.
+
+    Records are plain dicts with an ``id`` key, grouped by user and kind
+    (``conditions`` / ``medications``) and returned in insertion order.
+    Mutating methods return ``False`` when the write could not be persisted.
+
+    Backends with ``versioned = True`` are safe to share between processes:
+    they keep a per-user version that every write bumps, which callers use
+    to validate cached copies and for optimistic ``replace_user_data``.
+    """
+
+    versioned = False
+
+    def get_user_data(self, user_id: str) -> Dict:
+        return {kind: self.list_records(user_id, kind) for kind in RECORD_KINDS}
+
+    def get_user_data_versioned(self, user_id: str) -> Tuple[Dict, Optional[int]]:
+        return self.get_user_data(user_id), None
+
+    def user_version(self, user_id: str) -> Optional[int]:
+        return None
+
+    def last_write_version(self) -> Optional[int]:
+        """Version produced by this thread's most recent successful write."""
+        return None
+
+    def change_token(self) -> Optional[int]:
+        """Value that changes whenever another connection or process commits."""
+        return None
+
+    def replace_user_data(self, user_id: str, user_data: Dict, expected_version: Optional[int] = None) -> bool:
+        """Overwrite a user's records; with ``expected_version``, fail if it is stale."""
+        raise NotImplementedError
+
+    def list_records(self, user_id: str, kind: str) -> List[Dict]:
+        raise NotImplementedError
+
+    def insert_record(self, user_id: str, kind: str, record: Dict) -> bool:
+        raise NotImplementedError
+
+    def delete_record(self, user_id: str, kind: str, record_id: str) -> bool:
+        raise NotImplementedError
+
+    def update_record(self, user_id: str, kind: str, record_id: str, mutate: Callable[[Dict], None]) -> bool:
+        raise NotImplementedError
+
+    def import_all(self, all_data: Dict) -> int:
+        """Bulk-load ``{user_id: user_data}``; returns the number of users written."""
+        count = 0
+        for user_id, user_data in all_data.items():
+            if self.replace_user_data(user_id, user_data):
+                count += 1
+        return count
+
+    def is_empty(self) -> bool:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class JSONFileStorage(StorageBackend):
+    """Legacy single-document store: every call re-reads and rewrites the whole file.
+
+    Read-modify-write cycles hold an exclusive lock on ``<file>.lock`` and the
+    file is replaced atomically, so concurrent workers do not lose updates.
+    """
+
+    def __init__(self, file_path: str = "mental_health_data.json"):
+        self.file_path = file_path
+        self._thread_lock = threading.Lock()
+        self._ensure_file_exists()
+
+    @contextmanager
+    def _locked(self):
+        with self._thread_lock:
+            if fcntl is None:
+                yield
+                return
+            with open(f"{self.file_path}.lock", 'w') as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _ensure_file_exists(self):
+        if not os.path.exists(self.file_path):
+            with open(self.file_path, 'w') as f:
+                json.dump({}, f)
+
+    def _load_data(self) -> Dict:
+        try:
+            with open(self.file_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.error("Error loading mental health data", extra={"error": str(e)})
+            return {}
+
+    def _save_data(self, data: Dict) -> bool:
+        try:
+            tmp_path = f"{self.file_path}.tmp"
+            with open(tmp_path, 'w') as f:
+                json.dump(data, f, indent=2)
+            os.replace(tmp_path, self.file_path)
+            return True
+        except Exception as e:
+            logger.error("Error saving mental health data", extra={"error": str(e)})
+            return False
+
+    def get_user_data(self, user_id: str) -> Dict:
+        user_data = self._load_data().get(user_id, {})
+        return {kind: user_data.get(kind, []) for kind in RECORD_KINDS}
+
+    def replace_user_data(self, user_id: str, user_data: Dict, expected_version: Optional[int] = None) -> bool:
+        if expected_version is not None:
+            raise ValueError("JSON storage does not support versioned writes")
+        with self._locked():
+            return self._put_user(user_id, user_data)
+
+    def _put_user(self, user_id: str, user_data: Dict) -> bool:
+        all_data = self._load_data()
+        all_data[user_id] = user_data
+        return self._save_data(all_data)
+
+    def list_records(self, user_id: str, kind: str) -> List[Dict]:
+        return self.get_user_data(user_id)[kind]
+
+    def insert_record(self, user_id: str, kind: str, record: Dict) -> bool:
+        with self._locked():
+            user_data = self.get_user_data(user_id)
+            user_data[kind].append(record)
+            return self._put_user(user_id, user_data)
+
+    def delete_record(self, user_id: str, kind: str, record_id: str) -> bool:
+        with self._locked():
+            user_data = self.get_user_data(user_id)
+            user_data[kind] = [r for r in user_data[kind] if r['id'] != record_id]
+            return self._put_user(user_id, user_data)
+
+    def update_record(self, user_id: str, kind: str, record_id: str, mutate: Callable[[Dict], None]) -> bool:
+        with self._locked():
+            user_data = self.get_user_data(user_id)
+            for record in user_data[kind]:
+                if record['id'] == record_id:
+                    mutate(record)
+                    break
+            return self._put_user(user_id, user_data)
+
+    def import_all(self, all_data: Dict) -> int:
+        with self._locked():
+            merged = self._load_data()
+            merged.update(all_data)
+            return len(all_data) if self._save_data(merged) else 0
+
+    def is_empty(self) -> bool:
+        return not self._load_data()
+
+
+class SQLiteStorage(StorageBackend):
+    """SQLite store with one row per record, indexed by (user_id, kind).
+
+    Reads and single-record writes only touch the rows of the requesting
+    user. The database runs in WAL mode so readers never block the writer.
+    Connections are opened per thread.
+
+    Every write runs in a ``BEGIN IMMEDIATE`` transaction that also bumps
+    the user's row in ``user_versions``, so the database can be shared by
+    several uvicorn workers without lost updates.
+    """
+
+    versioned = True
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS records (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id TEXT NOT NULL,
+            kind TEXT NOT NULL,
+            id TEXT NOT NULL,
+            payload TEXT NOT NULL,
+            UNIQUE (user_id, kind, id)
+        );
+        CREATE INDEX IF NOT EXISTS idx_records_user_kind ON records (user_id, kind, seq);
+        CREATE TABLE IF NOT EXISTS user_versions (
+            user_id TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        );
+    """
+
+    def __init__(self, db_path: str = "mental_health_data.db"):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript(self.SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    def _write(self, user_id: str, apply: Callable[[sqlite3.Connection], None], expected_version: Optional[int] = None) -> bool:
+        self._local.last_version = None
+        try:
+            with self._connect() as conn:
+                # BEGIN IMMEDIATE takes the write lock before any read so the
+                # read-modify-write cannot interleave with another writer.
+                conn.execute("BEGIN IMMEDIATE")
+                version = self._version(conn, user_id)
+                if expected_version is not None and version != expected_version:
+                    return False
+                apply(conn)
+                conn.execute(
+                    "INSERT INTO user_versions (user_id, version) VALUES (?, ?) "
+                    "ON CONFLICT (user_id) DO UPDATE SET version = excluded.version",
+                    (user_id, version + 1)
+                )
+            self._local.last_version = version + 1
+            return True
+        except sqlite3.Error as e:
+            logger.error("Error saving mental health data", extra={"error": str(e)})
+            return False
+
+    @staticmethod
+    def _version(conn: sqlite3.Connection, user_id: str) -> int:
+        row = conn.execute("SELECT version FROM user_versions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else 0
+
+    def user_version(self, user_id: str) -> int:
+        return self._version(self._connect(), user_id)
+
+    def last_write_version(self) -> Optional[int]:
+        return getattr(self._local, 'last_version', None)
+
+    def change_token(self) -> int:
+        return self._connect().execute("PRAGMA data_version").fetchone()[0]
+
+    def replace_user_data(self, user_id: str, user_data: Dict, expected_version: Optional[int] = None) -> bool:
+        def apply(conn: sqlite3.Connection):
+            conn.execute("DELETE FROM records WHERE user_id = ?", (user_id,))
+            conn.executemany(
+                "INSERT INTO records (user_id, kind, id, payload) VALUES (?, ?, ?, ?)",
+                [
+                    (user_id, kind, record['id'], json.dumps(record))
+                    for kind in RECORD_KINDS
+                    for record in user_data.get(kind, [])
+                ]
+            )
+        return self._write(user_id, apply, expected_version)
+
+    def list_records(self, user_id: str, kind: str) -> List[Dict]:
+        rows = self._connect().execute(
+            "SELECT payload FROM records WHERE user_id = ? AND kind = ? ORDER BY seq",
+            (user_id, kind)
+        ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+    def get_user_data(self, user_id: str) -> Dict:
+        return self.get_user_data_versioned(user_id)[0]
+
+    def get_user_data_versioned(self, user_id: str) -> Tuple[Dict, int]:
+        user_data = empty_user_data()
+        conn = self._connect()
+        # One read transaction so the rows and the version are from the same snapshot.
+        conn.execute("BEGIN")
+        try:
+            rows = conn.execute(
+                "SELECT kind, payload FROM records WHERE user_id = ? ORDER BY seq",
+                (user_id,)
+            ).fetchall()
+            version = self._version(conn, user_id)
+        finally:
+            conn.execute("COMMIT")
+        for kind, payload in rows:
+            if kind in user_data:
+                user_data[kind].append(json.loads(payload))
+        return user_data, version
+
+    def insert_record(self, user_id: str, kind: str, record: Dict) -> bool:
+        return self._write(user_id, lambda conn: conn.execute(
+            "INSERT INTO records (user_id, kind, id, payload) VALUES (?, ?, ?, ?)",
+            (user_id, kind, record['id'], json.dumps(record))
+        ))
+
+    def delete_record(self, user_id: str, kind: str, record_id: str) -> bool:
+        return self._write(user_id, lambda conn: conn.execute(
+            "DELETE FROM records WHERE user_id = ? AND kind = ? AND id = ?",
+            (user_id, kind, record_id)
+        ))
+
+    def update_record(self, user_id: str, kind: str, record_id: str, mutate: Callable[[Dict], None]) -> bool:
+        def apply(conn: sqlite3.Connection):
+            row = conn.execute(
+                "SELECT payload FROM records WHERE user_id = ? AND kind = ? AND id = ?",
+                (user_id, kind, record_id)
+            ).fetchone()
+            if row is not None:
+                record = json.loads(row[0])
+                mutate(record)
+                conn.execute(
+                    "UPDATE records SET payload = ? WHERE user_id = ? AND kind = ? AND id = ?",
+                    (json.dumps(record), user_id, kind, record_id)
+                )
+        return self._write(user_id, apply)
+
+    def is_empty(self) -> bool:
+        return self._connect().execute("SELECT 1 FROM records LIMIT 1").fetchone() is None
+
+    def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+        self._local = threading.local()
+
+
+def migrate_json_to_storage(json_path: str, storage: StorageBackend) -> int:
+    """One-shot import of a legacy ``mental_health_data.json`` into ``storage``.
+
+    Returns the number of users imported. The JSON file is left in place.
+    """
+    if not os.path.exists(json_path):
+        return 0
+    with open(json_path, 'r') as f:
+        all_data = json.load(f)
+    return storage.import_all(all_data)
+
+
+def create_storage(backend: str = None, path: str = None, legacy_json_path: str = "mental_health_data.json") -> StorageBackend:
+    """Build the configured backend (``MENTAL_HEALTH_DB_BACKEND``: sqlite | journal | json).
+
+    A fresh SQLite or journal store is seeded from the legacy JSON file on first use.
+    """
+    backend = (backend or os.getenv("MENTAL_HEALTH_DB_BACKEND", "sqlite")).lower()
+
+    if backend == "json":
+        return JSONFileStorage(path or os.getenv("MENTAL_HEALTH_DB_PATH", legacy_json_path))
+
+    if backend == "sqlite":
+        path = path or os.getenv("MENTAL_HEALTH_DB_PATH", "mental_health_data.db")
+        storage = SQLiteStorage(path)
+    elif backend == "journal":
+        from database.journal import JournalStorage
+
+        path = path or os.getenv("MENTAL_HEALTH_DB_PATH", "mental_health_journal.json")
+        storage = JournalStorage(
+            path,
+            fsync=os.getenv("MENTAL_HEALTH_JOURNAL_FSYNC", "true").lower() == "true",
+            compact_threshold=int(os.getenv("MENTAL_HEALTH_JOURNAL_COMPACT_OPS", "1000")),
+            compact_interval=float(os.getenv("MENTAL_HEALTH_JOURNAL_COMPACT_INTERVAL", "30"))
+        )
+    else:
+        raise ValueError(f"Unknown mental health storage backend: {backend}")
+
+    if legacy_json_path and storage.is_empty() and os.path.exists(legacy_json_path):
+        migrated = migrate_json_to_storage(legacy_json_path, storage)
+        logger.info("Migrated legacy mental health data", extra={"users": migrated, "source": legacy_json_path, "target": path})
+    return storage
+
+
+if __name__ == "__main__":
+    import sys
+
+    source = sys.argv[1] if len(sys.argv) > 1 else "mental_health_data.json"
+    target = sys.argv[2] if len(sys.argv) > 2 else "mental_health_data.db"
+    migrated = migrate_json_to_storage(source, SQLiteStorage(target))
+    print(f"Migrated {migrated} users from {source} to {target}")
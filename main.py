@@ -1,22 +1,59 @@
+import time
+_import_started = time.perf_counter()
+
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from starlette.middleware.sessions import SessionMiddleware
 from fastapi.templating import Jinja2Templates
 from dotenv import load_dotenv
+import asyncio
+import logging
 import os
 
 # Load environment variables
 load_dotenv()
 
+from services.log import configure_logging
+configure_logging()
+
 # Import routers
 from routes.auth import router as auth_router
-from routes import dashboard, mental_health, spotify
+from routes import analytics, dashboard, mental_health, metrics, spotify
+from services.http_client import start_http_client, close_http_client
+from database.mental_health_db import async_mental_health_db
+from services.google_fit import google_fit_service
+from services.sessions import ServerSessionMiddleware
+from database.session_store import create_session_store
+from services.metrics import MetricsMiddleware, monitor_event_loop, register_cache
+
+logger = logging.getLogger(__name__)
+
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", str(14 * 24 * 3600)))
+session_store = create_session_store(max_age=SESSION_MAX_AGE)
+if getattr(session_store, "cache", None) is not None:
+    register_cache("sessions", session_store.cache.stats)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Provider SDKs load on first use; see benchmarks/startup_time.py
+    logger.info("App imported", extra={"import_ms": round((_app_imported - _import_started) * 1000)})
+    # One pooled HTTP client (keep-alive, HTTP/2) shared by all upstream services
+    await start_http_client()
+    loop_monitor = asyncio.create_task(monitor_event_loop())
+    yield
+    loop_monitor.cancel()
+    # Finish writing daily summaries still being materialized
+    await google_fit_service.sync_engine.summaries.drain()
+    await close_http_client()
+    async_mental_health_db.shutdown()
+    session_store.close()
 
 # Initialize app
 app = FastAPI(
     title="Health & Music Dashboard",
     description="Your Google Fit data, Spotify listening activity, and mental health tracking in one place",
-    version="2.0.0"
+    version="2.0.0",
+    lifespan=lifespan
 )
 
 # CORS Middleware — ✅ Must come before routers
@@ -28,21 +65,32 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Session Middleware — also before routers
+# Session Middleware — also before routers. The cookie holds only an opaque
+# id; credentials stay in the server-side store (SESSION_BACKEND)
 app.add_middleware(
-    SessionMiddleware, 
-    secret_key=os.getenv("FLASK_SECRET_KEY", "super-secret-key-123")
+    ServerSessionMiddleware,
+    store=session_store,
+    max_age=SESSION_MAX_AGE,
+    https_only=os.getenv("SESSION_HTTPS_ONLY", "false").lower() == "true"
 )
 
+# Metrics Middleware — added last so it is outermost and times the whole
+# request, sessions included
+app.add_middleware(MetricsMiddleware)
+
 # Routers
 app.include_router(auth_router, tags=["Authentication"])
 app.include_router(dashboard.router, tags=["Dashboard"])
+app.include_router(analytics.router, tags=["Analytics"])
 app.include_router(mental_health.router, prefix="/api/mental-health", tags=["Mental Health"])
 app.include_router(spotify.router, prefix="/spotify", tags=["Spotify"])
+app.include_router(metrics.router, tags=["Metrics"])
 
 # Templates (optional)
 templates = Jinja2Templates(directory="templates")
 
+_app_imported = time.perf_counter()
+
 @app.get("/")
 async def root():
     return {"message": "Health & Music Dashboard API", "docs": "/docs"}
@@ -14,11 +14,15 @@ class SleepData(BaseModel):
     stage: int
 
 class SpotifyTrack(BaseModel):
+    id: Optional[str] = None
     name: str
     artist: str
     album: Optional[str] = None
     image: Optional[str] = None
     played_at: Optional[str] = None
+    progress_ms: Optional[int] = None
+    duration_ms: Optional[int] = None
+    is_playing: Optional[bool] = None
 
 class DashboardData(BaseModel):
     step_data: List[StepData]
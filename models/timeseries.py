@@ -0,0 +1,67 @@
+from array import array
+from typing import Dict, Iterable, List, Optional, Type
+from pydantic import BaseModel
+from models.fitness import StepData, HeartRateData, SleepData
+
+
+class TimeSeries:
+    """One fitness metric as parallel columns instead of a list of models.
+
+    ``dates`` holds the YYYY-MM-DD of each point (one shared string per
+    day), ``values`` the metric in a typed ``array`` and, for sleep,
+    ``durations`` the segment length in seconds. Serialization goes
+    straight from the columns to JSON-ready dicts; pydantic models are
+    only built by ``to_models``.
+    """
+
+    __slots__ = ('model', 'field', 'dates', 'values', 'durations')
+
+    def __init__(self, model: Type[BaseModel], field: str, typecode: str, with_durations: bool = False):
+        self.model = model
+        self.field = field
+        self.dates: List[str] = []
+        self.values = array(typecode)
+        self.durations: Optional[array] = array('d') if with_durations else None
+
+    @classmethod
+    def steps(cls) -> "TimeSeries":
+        return cls(StepData, 'steps', 'q')
+
+    @classmethod
+    def heart_rate(cls) -> "TimeSeries":
+        return cls(HeartRateData, 'bpm', 'd')
+
+    @classmethod
+    def sleep(cls) -> "TimeSeries":
+        return cls(SleepData, 'stage', 'q', with_durations=True)
+
+    def append(self, date: str, value, duration: float = 0.0):
+        self.dates.append(date)
+        self.values.append(value)
+        if self.durations is not None:
+            self.durations.append(duration)
+
+    def extend(self, other: "TimeSeries"):
+        self.dates.extend(other.dates)
+        self.values.extend(other.values)
+        if self.durations is not None:
+            self.durations.extend(other.durations)
+
+    def fill(self, date: str, values: Iterable, durations: Optional[Iterable[float]] = None):
+        """Append a day's values (and durations) that share one date"""
+        start = len(self.values)
+        self.values.extend(values)
+        self.dates.extend([date] * (len(self.values) - start))
+        if self.durations is not None:
+            self.durations.extend(durations if durations is not None else [0.0] * (len(self.values) - start))
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def to_json(self) -> List[Dict]:
+        field = self.field
+        return [{'date': date, field: value} for date, value in zip(self.dates, self.values)]
+
+    def to_models(self) -> List[BaseModel]:
+        model, field = self.model, self.field
+        return [model(date=date, **{field: value}) for date, value in zip(self.dates, self.values)]
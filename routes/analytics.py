@@ -0,0 +1,41 @@
+import os
+from fastapi import APIRouter, Query, Request, HTTPException
+from services.analytics import analytics_service
+from services.google_fit import google_fit_service
+
+router = APIRouter()
+
+ANALYTICS_DAYS = int(os.getenv("ANALYTICS_DAYS", "30"))
+
+def get_current_user_id(request: Request) -> str:
+    """Get current user ID from session"""
+    if 'credentials' not in request.session:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return request.session['credentials'].get('client_id', 'default_user')
+
+@router.get("/api/analytics")
+async def analytics_api(request: Request, days: int = Query(None, ge=2, le=366)):
+    """Rolling averages, deltas and sleep-stage hours.
+
+    A result computed in the last ANALYTICS_FRESH_SECONDS is served without
+    touching Google Fit. Otherwise fitness data goes through the
+    incremental sync and is read as materialized daily summaries, and the
+    result is recomputed only if new fitness data arrived.
+
+    Medication correlations are left out for now: mental-health records are
+    stored by client_id, not per user, so they would be other users'.
+    """
+    get_current_user_id(request)
+    days = days or ANALYTICS_DAYS
+
+    credentials = request.session['credentials']
+    cached = analytics_service.fresh(google_fit_service.user_key(credentials), days)
+    if cached is not None:
+        return cached
+
+    summaries, updated_credentials = await google_fit_service.get_daily_summaries(credentials, days)
+    request.session['credentials'] = updated_credentials
+
+    user_key = google_fit_service.user_key(updated_credentials)
+    generation = google_fit_service.sync_engine.generation(user_key)
+    return analytics_service.get(user_key, days, generation, summaries, [])
@@ -3,18 +3,20 @@
 from fastapi import APIRouter, Request, HTTPException
 from fastapi.responses import RedirectResponse, JSONResponse, HTMLResponse
 from fastapi.templating import Jinja2Templates
+import logging
 import uuid
-import os
 import time
 from dotenv import load_dotenv
-from services.spotify import SpotifyService
-from services.googlefit import GoogleFitService
-from utils.jwt import create_jwt, verify_jwt
 
 load_dotenv()
 
+# Signing key and per-(provider, platform) clients are read once, after the environment is loaded
+from utils.jwt import create_jwt, verify_jwt
+from services.oauth_providers import oauth_providers
+
 router = APIRouter()
 templates = Jinja2Templates(directory="templates")
+logger = logging.getLogger(__name__)
 
 @router.get("/", response_class=HTMLResponse)
 async def index(request: Request):
@@ -30,46 +32,13 @@ async def authorize(request: Request, platform: str = "web", provider: str = "sp
     }
     state = create_jwt(state_payload)
 
-    if provider == "spotify":
-        if platform == "mobile":
-            client_id = os.getenv("SPOTIFY_MOBILE_CLIENT_ID")
-            client_secret = os.getenv("SPOTIFY_MOBILE_CLIENT_SECRET")
-            redirect_uri = os.getenv("SPOTIFY_MOBILE_REDIRECT_URI", "emotionwellbeing://auth-success")
-        else:
-            client_id = os.getenv("SPOTIFY_CLIENT_ID")
-            client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-            redirect_uri = os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:5000/auth/callback")
-
-        print("🔁 Spotify Redirect URI:", redirect_uri)
-        service = SpotifyService(client_id, client_secret)
-
-    elif provider == "google":
-        if platform == "mobile":
-            client_id = os.getenv("GOOGLE_MOBILE_CLIENT_ID")
-            client_secret = os.getenv("GOOGLE_MOBILE_CLIENT_SECRET")
-            redirect_uri = os.getenv("GOOGLE_MOBILE_REDIRECT_URI", "emotionwellbeing://auth-success")
-        else:
-            client_id = os.getenv("GOOGLE_CLIENT_ID")
-            client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
-            redirect_uri = os.getenv("GOOGLE_REDIRECT_URI", "http://127.0.0.1:5000/auth/callback")
-
-        print("🔁 Google Redirect URI:", redirect_uri)
-        service = GoogleFitService(client_id, client_secret)
-
-    else:
-        raise HTTPException(status_code=400, detail="Invalid provider")
-
-    auth_url = service.get_authorize_url(redirect_uri, state)
-    print(f"🔗 Auth URL for {provider}: {auth_url}")
+    auth_url = oauth_providers.authorize_url(provider, platform, state)
+    logger.info("Redirecting to OAuth provider", extra={"provider": provider, "platform": platform})
     return RedirectResponse(auth_url)
 
 @router.get("/callback")
 async def callback(request: Request, code: str = None, state: str = None):
     try:
-        print("🔄 Callback received")
-        print(f"   ↪️ code: {code}")
-        print(f"   ↪️ state: {state}")
-
         state_data = verify_jwt(state)
         if not state_data:
             raise HTTPException(status_code=400, detail="Invalid or expired OAuth state")
@@ -77,38 +46,11 @@ async def callback(request: Request, code: str = None, state: str = None):
         provider = state_data.get("provider")
         platform = state_data.get("platform")
 
-        if provider == "spotify":
-            if platform == "mobile":
-                client_id = os.getenv("SPOTIFY_MOBILE_CLIENT_ID")
-                client_secret = os.getenv("SPOTIFY_MOBILE_CLIENT_SECRET")
-                redirect_uri = os.getenv("SPOTIFY_MOBILE_REDIRECT_URI", "emotionwellbeing://auth-success")
-            else:
-                client_id = os.getenv("SPOTIFY_CLIENT_ID")
-                client_secret = os.getenv("SPOTIFY_CLIENT_SECRET")
-                redirect_uri = os.getenv("SPOTIFY_REDIRECT_URI", "http://127.0.0.1:5000/auth/callback")
-
-            service = SpotifyService(client_id, client_secret)
-
-        elif provider == "google":
-            if platform == "mobile":
-                client_id = os.getenv("GOOGLE_MOBILE_CLIENT_ID")
-                client_secret = os.getenv("GOOGLE_MOBILE_CLIENT_SECRET")
-                redirect_uri = os.getenv("GOOGLE_MOBILE_REDIRECT_URI", "emotionwellbeing://auth-success")
-            else:
-                client_id = os.getenv("GOOGLE_CLIENT_ID")
-                client_secret = os.getenv("GOOGLE_CLIENT_SECRET")
-                redirect_uri = os.getenv("GOOGLE_REDIRECT_URI", "http://127.0.0.1:5000/auth/callback")
-
-            service = GoogleFitService(client_id, client_secret)
-
-        else:
-            raise HTTPException(status_code=400, detail="Invalid provider")
-
-        print(f"🎟️ Exchanging code with {provider.capitalize()}")
-        print(f"   ↪️ Redirect URI: {redirect_uri}")
-        tokens = service.exchange_code_for_token(code, redirect_uri)
+        redirect_uri = oauth_providers.get(provider, platform).redirect_uri
 
-        print(f"✅ Token response from {provider.capitalize()}: {tokens}")
+        # Codes and tokens are never logged
+        logger.info("Exchanging OAuth code", extra={"provider": provider, "platform": platform, "redirect_uri": redirect_uri})
+        tokens = await oauth_providers.exchange_code(provider, platform, code)
 
         user_id = str(uuid.uuid4())
 
@@ -126,5 +68,5 @@ async def callback(request: Request, code: str = None, state: str = None):
             return JSONResponse({"token": jwt_token})
 
     except Exception as e:
-        print("❌ Callback exception:", e)
+        logger.exception("OAuth callback failed")
         return JSONResponse(status_code=500, content={"error": str(e)})
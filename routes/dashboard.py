@@ -1,18 +1,25 @@
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import JSONResponse
+from fastapi import APIRouter, Query, Request, Response, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from services.google_fit import google_fit_service
-from services.spotify import SpotifyService
-from database.mental_health_db import mental_health_db
+from services.spotify import SpotifyTokenExpired, spotify_service
+from services.spotify_tokens import session_token_key, session_user, spotify_token_store
+from services.responses import dumps, respond
+from database.mental_health_db import async_mental_health_db
+import asyncio
+import logging
 import os
-from typing import Dict, Any
+import time
+from typing import Awaitable, Dict, Any, Tuple
 
 router = APIRouter()
+logger = logging.getLogger(__name__)
 
-# Initialize Spotify service with credentials from environment
-spotify_service = SpotifyService(
-    client_id=os.getenv("SPOTIFY_CLIENT_ID"),
-    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET")
-)
+# Per-source budgets (seconds); a source that overruns is returned empty
+SOURCE_TIMEOUTS = {
+    "fitness": float(os.getenv("DASHBOARD_FITNESS_TIMEOUT", "10")),
+    "spotify": float(os.getenv("DASHBOARD_SPOTIFY_TIMEOUT", "5")),
+    "mental_health": float(os.getenv("DASHBOARD_MENTAL_HEALTH_TIMEOUT", "3")),
+}
 
 def get_current_user_id(request: Request) -> str:
     """Fetch current user ID from session"""
@@ -21,39 +28,66 @@ def get_current_user_id(request: Request) -> str:
     return request.session['credentials'].get('client_id', 'default_user')
 
 
-async def get_fitness_data(request: Request) -> tuple:
+async def get_fitness_data(request: Request, days: int = None) -> tuple:
     try:
-        print("🟢 Fetching fitness data...")
-        step_data, heart_rate_data, sleep_data, calories_data, updated_credentials = await google_fit_service.get_fitness_data(
-            request.session['credentials']
+        logger.debug("Fetching fitness data")
+        step_data, heart_rate_data, sleep_data, updated_credentials = await google_fit_service.get_fitness_data(
+            request.session['credentials'], days
         )
         request.session['credentials'] = updated_credentials
-        return step_data, heart_rate_data, sleep_data, calories_data
+        # Calories are not aggregated from Google Fit yet
+        return step_data.to_json(), heart_rate_data.to_json(), sleep_data.to_json(), []
     except Exception as e:
-        print(f"❌ Error fetching fitness data: {str(e)}")
+        logger.warning("Error fetching fitness data", extra={"error": str(e)})
         return [], [], [], []
 
 
+async def get_daily_summaries(request: Request, days: int = None) -> list:
+    try:
+        logger.debug("Fetching daily fitness summaries")
+        summaries, updated_credentials = await google_fit_service.get_daily_summaries(
+            request.session['credentials'], days
+        )
+        request.session['credentials'] = updated_credentials
+        return [summary.to_json() for summary in summaries]
+    except Exception as e:
+        logger.warning("Error fetching daily summaries", extra={"error": str(e)})
+        return []
+
+
 async def get_spotify_data(request: Request) -> tuple:
     spotify_connected = False
     current_track = None
     recent_tracks = []
     audio_summary = {}
 
+    spotify_user = None
     try:
-        user_id = get_current_user_id(request)
-        token_info = request.session.get(f'spotify_token_{user_id}')
+        get_current_user_id(request)
+        spotify_user = session_user(request.session)
+        session_token = request.session.get(session_token_key(spotify_user))
+        # Refreshed ahead of expiry; None when disconnected or the refresh failed
+        token_info = await spotify_token_store.get_token(spotify_user, session_token)
         spotify_connected = bool(token_info)
 
         if spotify_connected:
+            if token_info != session_token:
+                request.session[session_token_key(spotify_user)] = token_info
             access_token = token_info['access_token']
-            current_track = await spotify_service.get_current_track(access_token)
-            recent_tracks, audio_summary = await spotify_service.get_recent_tracks_with_features(access_token)
-
-            print("🟢 Spotify data fetched")
+            current_track, (recent_tracks, audio_summary) = await asyncio.gather(
+                spotify_service.get_current_track(access_token),
+                spotify_service.get_recent_tracks_with_features(access_token, user_key=spotify_user)
+            )
+
+            logger.debug("Spotify data fetched")
+    except SpotifyTokenExpired:
+        # Keep the refresh token: the next call renews the access token
+        # instead of forcing a full re-auth
+        logger.info("Spotify token rejected, refreshing on next request")
+        spotify_token_store.expire(spotify_user)
+        spotify_connected = False
     except Exception as e:
-        print(f"❌ Error fetching Spotify data: {str(e)}")
-        request.session.pop(f'spotify_token_{user_id}', None)
+        logger.warning("Error fetching Spotify data", extra={"error": str(e)})
         spotify_connected = False
 
     return spotify_connected, current_track, recent_tracks, audio_summary
@@ -62,37 +96,148 @@ async def get_spotify_data(request: Request) -> tuple:
 async def get_mental_health_data(request: Request) -> Dict[str, Any]:
     try:
         user_id = get_current_user_id(request)
-        return mental_health_db.get_user_data(user_id)
+        return await async_mental_health_db.get_user_data(user_id)
     except Exception as e:
-        print(f"❌ Error fetching mental health data: {str(e)}")
+        logger.warning("Error fetching mental health data", extra={"error": str(e)})
         return {'conditions': [], 'medications': []}
 
 
+async def fitness_section(request: Request, days: int = None) -> Dict[str, Any]:
+    step_data, heart_rate_data, sleep_data, calories_data = await get_fitness_data(request, days)
+    return {
+        "step_data": step_data,
+        "heart_rate_data": heart_rate_data,
+        "sleep_data": sleep_data,
+        "calories_data": calories_data,
+    }
+
+
+async def fitness_summary_section(request: Request, days: int = None) -> Dict[str, Any]:
+    return {"daily_summaries": await get_daily_summaries(request, days)}
+
+
+async def spotify_section(request: Request, days: int = None) -> Dict[str, Any]:
+    spotify_connected, current_track, recent_tracks, audio_summary = await get_spotify_data(request)
+    return {
+        "spotify_connected": spotify_connected,
+        "current_track": current_track,
+        "recent_tracks": recent_tracks,
+        "audio_summary": audio_summary,
+    }
+
+
+async def mental_health_section(request: Request, days: int = None) -> Dict[str, Any]:
+    return {"mental_health": await get_mental_health_data(request)}
+
+
+# Dashboard sections: fetcher and the value served if it times out
+SECTIONS = {
+    "fitness": (fitness_section, {"step_data": [], "heart_rate_data": [], "sleep_data": [], "calories_data": []}),
+    "spotify": (spotify_section, {"spotify_connected": False, "current_track": None, "recent_tracks": [], "audio_summary": {}}),
+    "mental_health": (mental_health_section, {"mental_health": {'conditions': [], 'medications': []}}),
+}
+
+# With ?summary=true, fitness is served as one pre-aggregated row per day
+SUMMARY_SECTIONS = {**SECTIONS, "fitness": (fitness_summary_section, {"daily_summaries": []})}
+
+
+async def timed_source(name: str, fetch: Awaitable, default: Any, timings: Dict[str, Tuple[float, bool]]) -> Any:
+    """Await one dashboard source within its budget, recording (duration ms, timed out)"""
+    started = time.perf_counter()
+    timed_out = False
+    try:
+        return await asyncio.wait_for(fetch, SOURCE_TIMEOUTS[name])
+    except asyncio.TimeoutError:
+        logger.warning("Dashboard source timed out", extra={"source": name, "timeout_s": SOURCE_TIMEOUTS[name]})
+        timed_out = True
+        return default
+    finally:
+        timings[name] = (round((time.perf_counter() - started) * 1000, 1), timed_out)
+
+
+def server_timing(timings: Dict[str, Tuple[float, bool]]) -> str:
+    return ", ".join(
+        f"{name};dur={duration}" + (';desc="timeout"' if timed_out else "")
+        for name, (duration, timed_out) in timings.items()
+    )
+
+
+async def timed_section(name: str, request: Request, days: int, timings: Dict[str, Tuple[float, bool]],
+                        sections: Dict = SECTIONS) -> Tuple[str, Dict[str, Any]]:
+    fetch, default = sections[name]
+    return name, await timed_source(name, fetch(request, days), default, timings)
+
+
 @router.get("/api/dashboard")
-async def dashboard_api(request: Request):
-    """Main API route for Android app to fetch all dashboard data"""
+async def dashboard_api(request: Request, response: Response, days: int = Query(None, ge=1, le=366),
+                        summary: bool = Query(False)):
+    """Main API route for Android app to fetch all dashboard data.
+
+    With ``summary=true`` the raw fitness points are replaced by
+    ``daily_summaries``: per-day totals read from materialized rows.
+    """
     if 'credentials' not in request.session:
         raise HTTPException(status_code=401, detail="Not authenticated")
 
     try:
-        # Fetch Google Fit, Spotify, Mental Health
-        step_data, heart_rate_data, sleep_data, calories_data = await get_fitness_data(request)
-        spotify_connected, current_track, recent_tracks, audio_summary = await get_spotify_data(request)
-        mental_health_data = await get_mental_health_data(request)
-
-        return {
-            "step_data": step_data,
-            "heart_rate_data": heart_rate_data,
-            "sleep_data": sleep_data,
-            "calories_data": calories_data,
-            "spotify_connected": spotify_connected,
-            "current_track": current_track,
-            "recent_tracks": recent_tracks,
-            "audio_summary": audio_summary,
-            "mental_health": mental_health_data
-        }
-
-    except Exception as e:
-        print(f"❌ Error in /api/dashboard: {str(e)}")
+        # Fetch Google Fit, Spotify, Mental Health concurrently; per-source
+        # timings go out in the Server-Timing header
+        timings: Dict[str, Tuple[float, bool]] = {}
+        started = time.perf_counter()
+        selected = SUMMARY_SECTIONS if summary else SECTIONS
+        sections = await asyncio.gather(*(timed_section(name, request, days, timings, selected) for name in selected))
+        timings["total"] = (round((time.perf_counter() - started) * 1000, 1), False)
+        timing_header = server_timing(timings)
+        response.headers["Server-Timing"] = timing_header
+
+        dashboard = {}
+        for _, section in sections:
+            dashboard.update(section)
+        return respond(request, dashboard, headers={"Server-Timing": timing_header})
+
+    except Exception:
+        logger.exception("Error in /api/dashboard")
         raise HTTPException(status_code=500, detail="Internal server error")
 
+
+@router.get("/api/dashboard/stream")
+async def dashboard_stream(request: Request, days: int = Query(None, ge=1, le=366), summary: bool = Query(False)):
+    """Progressive dashboard: each section is sent as soon as it resolves.
+
+    Responds with server-sent events when the client accepts
+    text/event-stream, otherwise with NDJSON (one JSON object per line).
+    Each message is {"section", "data", "duration_ms", "timed_out"}; a final "done"
+    message carries the total. Response headers go out before any section
+    resolves; credentials refreshed meanwhile are saved to the server-side
+    session when the stream ends. ``summary`` works as on /api/dashboard.
+    """
+    if 'credentials' not in request.session:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+
+    sse = "text/event-stream" in request.headers.get("accept", "")
+    started = time.perf_counter()
+    timings: Dict[str, Tuple[float, bool]] = {}
+    selected = SUMMARY_SECTIONS if summary else SECTIONS
+    tasks = [asyncio.ensure_future(timed_section(name, request, days, timings, selected)) for name in selected]
+
+    def encode(section: str, payload: Dict[str, Any]) -> str:
+        body = dumps({"section": section, **payload}).decode()
+        return f"event: {section}\ndata: {body}\n\n" if sse else body + "\n"
+
+    async def events():
+        try:
+            for next_section in asyncio.as_completed(tasks):
+                name, data = await next_section
+                duration, timed_out = timings[name]
+                yield encode(name, {"data": data, "duration_ms": duration, "timed_out": timed_out})
+            yield encode("done", {"duration_ms": round((time.perf_counter() - started) * 1000, 1)})
+        finally:
+            # Client went away mid-stream: stop the remaining upstream fetches
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,68 @@
+import hmac
+import os
+from fastapi import APIRouter, Request, HTTPException
+from fastapi.responses import PlainTextResponse
+from services.metrics import registry, register_cache, register_single_flight, register_stats
+from services.google_fit import google_fit_service
+from services.google_auth import google_token_manager
+from services.spotify import spotify_service
+from services.spotify_tokens import spotify_token_store
+from services.spotify_live import now_playing_hub
+from services.analytics import analytics_service
+from database.mental_health_db import mental_health_db
+
+# When set, scrapers must send "Authorization: Bearer <METRICS_TOKEN>"
+METRICS_TOKEN = os.getenv("METRICS_TOKEN")
+
+router = APIRouter()
+
+register_cache("fitness_days", google_fit_service.sync_engine.day_cache.cache.stats)
+register_cache("daily_summaries", google_fit_service.sync_engine.summaries.cache.stats)
+register_cache("google_tokens", google_token_manager.cache.stats)
+register_cache("spotify_tokens", spotify_token_store.tokens.stats)
+register_cache("spotify_now_playing", spotify_service.now_playing.stats)
+register_cache("spotify_recent_history", spotify_service.recent_history.stats)
+register_cache("spotify_audio_features", spotify_service.audio_features.stats)
+register_cache("analytics", analytics_service.cache.stats)
+register_cache("mental_health", mental_health_db.cache.stats)
+
+# Concurrent identical calls collapsed onto one upstream fetch
+register_single_flight("google_fit", google_fit_service.single_flight.stats)
+register_single_flight("google_tokens", google_token_manager.single_flight.stats)
+register_single_flight("spotify", spotify_service.single_flight.stats)
+register_single_flight("spotify_tokens", spotify_token_store.single_flight.stats)
+
+register_stats(google_fit_service.day_cache.stats, {
+    "upstream_calls": ("fitness_upstream_calls_total", "counter", "Google Fit aggregate requests made by syncs"),
+    "days_fetched": ("fitness_days_fetched_total", "counter", "Days requested from Google Fit"),
+    "days_from_cache": ("fitness_days_from_cache_total", "counter", "Days served from the day cache instead of Google Fit"),
+})
+register_stats(google_fit_service.sync_engine.summaries.stats, {
+    "materialized": ("daily_summaries_materialized_total", "counter", "Daily summaries written after a sync"),
+    "failures": ("daily_summary_failures_total", "counter", "Summary materializations that failed to store"),
+    "pending": ("daily_summaries_pending", "gauge", "Materializations still running"),
+})
+register_stats(spotify_service.stats, {
+    "rate_limited": ("spotify_rate_limited_total", "counter", "Spotify 429 responses that started a backoff"),
+})
+
+TOKEN_METRICS = {
+    "refreshes": ("token_refreshes_total", "counter", "Access tokens refreshed"),
+    "refresh_failures": ("token_refresh_failures_total", "counter", "Token refreshes that failed"),
+}
+register_stats(google_token_manager.stats, TOKEN_METRICS, {"provider": "google"})
+register_stats(spotify_token_store.stats, TOKEN_METRICS, {"provider": "spotify"})
+
+register_stats(now_playing_hub.stats, {
+    "users": ("now_playing_users", "gauge", "Users with a live now-playing poller"),
+    "subscribers": ("now_playing_subscribers", "gauge", "Open now-playing SSE and WebSocket connections"),
+    "polls": ("now_playing_polls_total", "counter", "Now-playing polls of Spotify"),
+    "pushes": ("now_playing_pushes_total", "counter", "Now-playing messages pushed to connections"),
+})
+
+@router.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    """Request, upstream, storage, cache and event-loop metrics in the Prometheus text format"""
+    if METRICS_TOKEN and not hmac.compare_digest(request.headers.get("authorization", ""), f"Bearer {METRICS_TOKEN}"):
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
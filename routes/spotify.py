@@ -1,16 +1,16 @@
+import asyncio
+import json
 import uuid
-import os
-from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import RedirectResponse
-from services.spotify import SpotifyService
+from fastapi import APIRouter, Request, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi.responses import RedirectResponse, StreamingResponse
+from services.spotify import spotify_service
+from services.spotify_live import now_playing_hub
+from services.spotify_tokens import session_token_key, session_user, spotify_token_store
 
-router = APIRouter()
+# Seconds between SSE keep-alive comments on an idle stream
+KEEPALIVE_INTERVAL = 15
 
-# Initialize Spotify service
-spotify_service = SpotifyService(
-    client_id=os.getenv("SPOTIFY_CLIENT_ID"),
-    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET")
-)
+router = APIRouter()
 
 @router.get("/authorize")
 async def spotify_authorize(request: Request):
@@ -27,10 +27,14 @@ async def spotify_callback(request: Request):
 
     if state != request.session.get('spotify_state'):
         raise HTTPException(status_code=400, detail="Invalid Spotify state")
+    # Same per-user key and session key the dashboard reads the token from
+    user = session_user(request.session)
+    if user is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
 
     try:
         token_data = await spotify_service.exchange_code_for_token(code)
-        request.session['spotify_token'] = token_data
+        request.session[session_token_key(user)] = spotify_token_store.save(user, token_data)
         return RedirectResponse(url="/dashboard")
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to authenticate with Spotify: {str(e)}")
@@ -38,4 +42,71 @@ async def spotify_callback(request: Request):
 @router.get("/dashboard")
 async def spotify_dashboard():
     # Redirect to main dashboard
-    return RedirectResponse(url="/dashboard")
\ No newline at end of file
+    return RedirectResponse(url="/dashboard")
+
+def _live_user(session) -> tuple:
+    user = session_user(session)
+    if user is None:
+        return None, None
+    return user, session.get(session_token_key(user))
+
+@router.get("/now-playing/stream")
+async def now_playing_stream(request: Request):
+    """Server-sent now-playing updates: a snapshot, then only changed fields.
+
+    One poller per user serves all of that user's connections, in place of
+    clients re-polling /api/dashboard.
+    """
+    user_id, session_token = _live_user(request.session)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Not authenticated")
+    queue = now_playing_hub.subscribe(user_id, session_token)
+
+    async def events():
+        try:
+            while True:
+                try:
+                    message = await asyncio.wait_for(queue.get(), KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield f"event: {message['type']}\ndata: {json.dumps(message)}\n\n"
+        finally:
+            now_playing_hub.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@router.websocket("/now-playing/ws")
+async def now_playing_ws(websocket: WebSocket):
+    """WebSocket variant of /now-playing/stream, with the same messages"""
+    user_id, session_token = _live_user(websocket.session)
+    if user_id is None:
+        await websocket.close(code=4401)
+        return
+    await websocket.accept()
+    queue = now_playing_hub.subscribe(user_id, session_token)
+
+    async def send():
+        while True:
+            await websocket.send_json(await queue.get())
+
+    async def receive():
+        # Nothing is sent while the track is unchanged, so only reading
+        # notices a closed client; the poller must stop as soon as it does
+        while (await websocket.receive())["type"] != "websocket.disconnect":
+            pass
+
+    tasks = {asyncio.ensure_future(send()), asyncio.ensure_future(receive())}
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        for task in done:
+            if not isinstance(task.exception(), WebSocketDisconnect):
+                task.result()
+    finally:
+        for task in tasks:
+            task.cancel()
+        now_playing_hub.unsubscribe(user_id, queue)
@@ -0,0 +1,176 @@
+import os
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+import numpy as np
+from database.cache import LRUCache
+from models.mental_health import Medication
+from services.fitness_cache import SLEEP_STAGES, DailySummary
+
+
+def _json_floats(values: np.ndarray, digits: int = 2) -> List[Optional[float]]:
+    """Rounded floats with NaN as None"""
+    rounded = np.round(values.astype(float), digits)
+    return [None if np.isnan(value) else float(value) for value in rounded]
+
+
+def _json_float(value: float, digits: int = 2) -> Optional[float]:
+    return None if value is None or np.isnan(value) else round(float(value), digits)
+
+
+def day_axis(days: int, now: Optional[datetime] = None) -> np.ndarray:
+    """The last ``days`` calendar days, today included, as datetime64[D]"""
+    today = np.datetime64((now or datetime.now()).date(), 'D')
+    return today - np.arange(days - 1, -1, -1)
+
+
+def _day_index(summaries: List[DailySummary], axis: np.ndarray):
+    """Position of each summary on ``axis`` and a mask of summaries inside it"""
+    index = (np.array([summary.date for summary in summaries], dtype='datetime64[D]') - axis[0]).astype(int)
+    return index, (index >= 0) & (index < len(axis))
+
+
+def daily_column(summaries: List[DailySummary], axis: np.ndarray, field: str) -> np.ndarray:
+    """One summary field per day of ``axis``; days without a value are NaN"""
+    column = np.full(len(axis), np.nan)
+    if summaries:
+        index, inside = _day_index(summaries, axis)
+        values = np.array([getattr(summary, field) for summary in summaries], dtype=float)
+        column[index[inside]] = values[inside]
+    return column
+
+
+def rolling_mean(values: np.ndarray, window: int) -> np.ndarray:
+    """Trailing mean over ``window`` days, ignoring missing (NaN) days"""
+    present = ~np.isnan(values)
+    sums = np.cumsum(np.where(present, values, 0.0))
+    counts = np.cumsum(present)
+    sums[window:] = sums[window:] - sums[:-window]
+    counts[window:] = counts[window:] - counts[:-window]
+    return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan)
+
+
+def correlation(x: np.ndarray, y: np.ndarray) -> float:
+    """Pearson correlation over days where both are present; NaN if undefined"""
+    both = ~np.isnan(x) & ~np.isnan(y)
+    if both.sum() < 3 or np.std(x[both]) == 0 or np.std(y[both]) == 0:
+        return np.nan
+    return float(np.corrcoef(x[both], y[both])[0, 1])
+
+
+def sleep_stage_hours(summaries: List[DailySummary], axis: np.ndarray) -> Dict[str, List[Optional[float]]]:
+    """Hours per sleep stage and day"""
+    if not summaries:
+        return {}
+    index, inside = _day_index(summaries, axis)
+    stages = sorted({stage for summary in summaries for stage in summary.sleep_secs})
+    breakdown = {}
+    for stage in stages:
+        hours = np.array([summary.sleep_hours(stage) for summary in summaries])
+        per_day = np.zeros(len(axis))
+        per_day[index[inside]] = hours[inside]
+        breakdown[SLEEP_STAGES.get(stage, str(stage))] = _json_floats(per_day)
+    return breakdown
+
+
+def medication_effects(medications: List[Medication], axis: np.ndarray, steps: np.ndarray,
+                       heart_rate: np.ndarray) -> List[Dict]:
+    """Before/after means and the correlation of being on the medication with steps and heart rate"""
+    effects = []
+    for medication in medications:
+        if not medication.started_date:
+            continue
+        try:
+            started = np.datetime64(medication.started_date[:10], 'D')
+        except ValueError:
+            continue
+        on = (axis >= started).astype(float)
+        effect = {"medication_id": medication.id, "name": medication.name, "started_date": medication.started_date,
+                  "active": medication.active}
+        for name, values in (("steps", steps), ("heart_rate", heart_rate)):
+            before, after = values[on == 0], values[on == 1]
+            effect[name] = {
+                "mean_before": _json_float(np.nanmean(before)) if np.any(~np.isnan(before)) else None,
+                "mean_after": _json_float(np.nanmean(after)) if np.any(~np.isnan(after)) else None,
+                "correlation": _json_float(correlation(on, values), 3),
+            }
+        effects.append(effect)
+    return effects
+
+
+def compute_analytics(summaries: List[DailySummary], medications: List[Medication], days: int,
+                      window: int = 7, now: Optional[datetime] = None) -> Dict:
+    axis = day_axis(days, now)
+    daily_steps = daily_column(summaries, axis, 'steps')
+    daily_bpm = daily_column(summaries, axis, 'bpm_mean')
+    return {
+        "dates": [str(day) for day in axis],
+        "rolling_window": window,
+        "steps": {
+            "daily": _json_floats(daily_steps, 0),
+            "rolling_mean": _json_floats(rolling_mean(daily_steps, window), 1),
+            "delta": _json_floats(np.concatenate(([np.nan], np.diff(daily_steps))), 0),
+        },
+        "heart_rate": {
+            "daily": _json_floats(daily_bpm, 1),
+            "rolling_mean": _json_floats(rolling_mean(daily_bpm, window), 1),
+            "delta": _json_floats(np.concatenate(([np.nan], np.diff(daily_bpm))), 1),
+        },
+        "sleep_stage_hours": sleep_stage_hours(summaries, axis),
+        "steps_heart_rate_correlation": _json_float(correlation(daily_steps, daily_bpm), 3),
+        "medications": medication_effects(medications, axis, daily_steps, daily_bpm),
+    }
+
+
+class AnalyticsService:
+    """Per-user analytics, cached until the inputs change.
+
+    An entry is keyed by the user's ``user_key`` and window. For
+    ANALYTICS_FRESH_SECONDS (default 300) after it was computed or last
+    confirmed, ``fresh`` serves it without syncing, so a repeated view is a
+    dictionary lookup. After that the open days are synced again, and
+    ``get`` reuses the entry while the fitness sync generation and
+    medication fingerprint are unchanged. Up to ANALYTICS_CACHE_SIZE entries
+    (default 1000) are kept.
+    """
+
+    def __init__(self, cache_size: Optional[int] = None, window: Optional[int] = None,
+                 fresh_for: Optional[float] = None):
+        self.cache = LRUCache(max_size=cache_size if cache_size is not None else int(os.getenv("ANALYTICS_CACHE_SIZE", "1000")))
+        self.window = window or int(os.getenv("ANALYTICS_ROLLING_WINDOW", "7"))
+        self.fresh_for = fresh_for if fresh_for is not None else float(os.getenv("ANALYTICS_FRESH_SECONDS", "300"))
+        self.computations = 0
+        self.fresh_hits = 0
+
+    @staticmethod
+    def medication_fingerprint(medications: List[Medication]) -> tuple:
+        return tuple((m.id, m.started_date, m.active) for m in medications)
+
+    def fresh(self, user_key: str, days: int) -> Optional[Dict]:
+        """The cached result if it is recent enough to serve without a sync"""
+        cached = self.cache.get((user_key, days, datetime.now().date()))
+        if cached is None or time.monotonic() - cached[2] >= self.fresh_for:
+            return None
+        self.fresh_hits += 1
+        return cached[1]
+
+    def get(self, user_key: str, days: int, generation: int, summaries: List[DailySummary],
+            medications: List[Medication]) -> Dict:
+        key = (user_key, days, datetime.now().date())
+        inputs = (generation, self.medication_fingerprint(medications))
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == inputs:
+            # The sync confirmed the inputs; the entry is fresh again
+            self.cache.set(key, (inputs, cached[1], time.monotonic()))
+            return cached[1]
+
+        self.computations += 1
+        result = compute_analytics(summaries, medications, days, self.window)
+        self.cache.set(key, (inputs, result, time.monotonic()))
+        return result
+
+    def stats(self) -> dict:
+        return {**self.cache.stats(), "computations": self.computations, "fresh_hits": self.fresh_hits}
+
+
+analytics_service = AnalyticsService()
@@ -0,0 +1,77 @@
+import asyncio
+import logging
+import os
+from typing import Dict, Iterable, Optional, Set
+from database.cache import LRUCache
+from database.fitness_store import FitnessStore
+from services.fitness_cache import DailySummary, DayBucket
+
+logger = logging.getLogger(__name__)
+
+
+class DailySummaryStore:
+    """Materialized DailySummary rows for closed days.
+
+    When a sync stores closed days, ``materialize`` summarizes them in a
+    background task that writes the rows to the FitnessStore, so the
+    request path only reads them. Reads go to an LRU of summaries
+    (DAILY_SUMMARY_CACHE_DAYS user-days, default 10000) and then the store.
+    """
+
+    def __init__(self, store: FitnessStore, cache_days: Optional[int] = None):
+        self.store = store
+        self.cache = LRUCache(max_size=cache_days if cache_days is not None else int(os.getenv("DAILY_SUMMARY_CACHE_DAYS", "10000")))
+        self._background: Set[asyncio.Task] = set()
+        self.materialized = 0
+        self.failures = 0
+
+    def materialize(self, user_key: str, buckets: Dict[str, DayBucket]):
+        """Summarize and store closed day buckets without blocking the caller"""
+        if not buckets:
+            return
+        task = asyncio.ensure_future(self._materialize(user_key, buckets))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _materialize(self, user_key: str, buckets: Dict[str, DayBucket]):
+        summaries = {day: DailySummary.from_bucket(day, bucket) for day, bucket in buckets.items()}
+        try:
+            await asyncio.to_thread(self.store.save_summaries, user_key, summaries)
+        except Exception as e:
+            self.failures += 1
+            logger.warning("Failed to store daily summaries", extra={"user_key": user_key, "error": str(e)})
+            return
+        for day, summary in summaries.items():
+            self.cache.set((user_key, day), summary)
+        self.materialized += len(summaries)
+
+    async def load(self, user_key: str, days: Iterable[str]) -> Dict[str, DailySummary]:
+        """Materialized summaries for ``days``; days not materialized yet are left out"""
+        summaries: Dict[str, DailySummary] = {}
+        missing = []
+        for day in days:
+            summary = self.cache.get((user_key, day))
+            if summary is not None:
+                summaries[day] = summary
+            else:
+                missing.append(day)
+
+        if missing:
+            stored = await asyncio.to_thread(self.store.load_summaries, user_key, missing)
+            for day, summary in stored.items():
+                self.cache.set((user_key, day), summary)
+                summaries[day] = summary
+        return summaries
+
+    async def drain(self):
+        """Wait for pending materializations, e.g. before shutdown"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        return {
+            **self.cache.stats(),
+            "pending": len(self._background),
+            "materialized": self.materialized,
+            "failures": self.failures,
+        }
@@ -0,0 +1,149 @@
+import os
+from typing import Dict, Optional
+from database.cache import LRUCache
+from models.timeseries import TimeSeries
+
+# Google Fit sleep.segment stage values
+SLEEP_STAGES = {1: 'awake', 2: 'sleep', 3: 'out_of_bed', 4: 'light', 5: 'deep', 6: 'rem'}
+# Stages that count towards time asleep
+ASLEEP_STAGES = (2, 4, 5, 6)
+
+
+class DayBucket:
+    """Parsed Google Fit points for one user and one calendar day"""
+
+    __slots__ = ('steps', 'heart_rate', 'sleep')
+
+    def __init__(self):
+        self.steps = TimeSeries.steps()
+        self.heart_rate = TimeSeries.heart_rate()
+        self.sleep = TimeSeries.sleep()
+
+    def to_payload(self) -> Dict[str, list]:
+        """Compact form for storage; the date is kept by the caller"""
+        return {
+            "steps": self.steps.values.tolist(),
+            "bpm": self.heart_rate.values.tolist(),
+            "sleep": self.sleep.values.tolist(),
+            "sleep_secs": self.sleep.durations.tolist(),
+        }
+
+    @classmethod
+    def from_payload(cls, date: str, payload: Dict[str, list]) -> "DayBucket":
+        # Rows stored before sleep durations were kept have none
+        bucket = cls()
+        bucket.steps.fill(date, payload.get("steps", []))
+        bucket.heart_rate.fill(date, payload.get("bpm", []))
+        bucket.sleep.fill(date, payload.get("sleep", []), payload.get("sleep_secs"))
+        return bucket
+
+
+class DailySummary:
+    """Pre-aggregated figures for one user and one calendar day.
+
+    ``steps`` is the day's total, the heart rate fields aggregate its bpm
+    points and ``sleep_secs`` maps sleep stage to seconds. Figures are None
+    when the day has no points of that kind.
+    """
+
+    __slots__ = ('date', 'steps', 'bpm_mean', 'bpm_min', 'bpm_max', 'bpm_samples', 'sleep_secs')
+
+    def __init__(self, date: str, steps: Optional[int] = None, bpm_mean: Optional[float] = None,
+                 bpm_min: Optional[float] = None, bpm_max: Optional[float] = None, bpm_samples: int = 0,
+                 sleep_secs: Optional[Dict[int, float]] = None):
+        self.date = date
+        self.steps = steps
+        self.bpm_mean = bpm_mean
+        self.bpm_min = bpm_min
+        self.bpm_max = bpm_max
+        self.bpm_samples = bpm_samples
+        self.sleep_secs = sleep_secs or {}
+
+    @classmethod
+    def from_bucket(cls, date: str, bucket: DayBucket) -> "DailySummary":
+        bpm = bucket.heart_rate.values
+        sleep_secs: Dict[int, float] = {}
+        for stage, duration in zip(bucket.sleep.values, bucket.sleep.durations):
+            sleep_secs[stage] = sleep_secs.get(stage, 0.0) + duration
+        return cls(
+            date,
+            steps=sum(bucket.steps.values) if len(bucket.steps) else None,
+            bpm_mean=sum(bpm) / len(bpm) if bpm else None,
+            bpm_min=min(bpm) if bpm else None,
+            bpm_max=max(bpm) if bpm else None,
+            bpm_samples=len(bpm),
+            sleep_secs=sleep_secs,
+        )
+
+    def to_payload(self) -> Dict:
+        """Compact form for storage; the date is kept by the caller"""
+        return {
+            "steps": self.steps,
+            "bpm": [self.bpm_mean, self.bpm_min, self.bpm_max, self.bpm_samples],
+            "sleep_secs": {str(stage): secs for stage, secs in self.sleep_secs.items()},
+        }
+
+    @classmethod
+    def from_payload(cls, date: str, payload: Dict) -> "DailySummary":
+        bpm_mean, bpm_min, bpm_max, bpm_samples = payload["bpm"]
+        return cls(date, payload["steps"], bpm_mean, bpm_min, bpm_max, bpm_samples,
+                   {int(stage): secs for stage, secs in payload["sleep_secs"].items()})
+
+    def sleep_hours(self, stage: int) -> float:
+        return self.sleep_secs.get(stage, 0.0) / 3600
+
+    def to_json(self) -> Dict:
+        return {
+            "date": self.date,
+            "steps": self.steps,
+            "heart_rate": {
+                "mean": round(self.bpm_mean, 1) if self.bpm_mean is not None else None,
+                "min": self.bpm_min,
+                "max": self.bpm_max,
+                "samples": self.bpm_samples,
+            },
+            "sleep_hours": round(sum(self.sleep_hours(stage) for stage in ASLEEP_STAGES), 2),
+            "sleep_stage_hours": {
+                SLEEP_STAGES.get(stage, str(stage)): round(self.sleep_hours(stage), 2)
+                for stage in sorted(self.sleep_secs)
+            },
+        }
+
+
+class FitnessDayCache:
+    """LRU of closed (immutable) day buckets keyed by (user, YYYY-MM-DD).
+
+    Size is FITNESS_CACHE_MAX_DAYS (user-days, default 10000) and TTL is
+    FITNESS_CACHE_TTL (seconds, default 0 = keep until evicted). Counters
+    track how many day buckets were served locally instead of upstream.
+    """
+
+    def __init__(self, max_days: Optional[int] = None, ttl: Optional[float] = None):
+        self.cache = LRUCache(
+            max_size=max_days if max_days is not None else int(os.getenv("FITNESS_CACHE_MAX_DAYS", "10000")),
+            ttl=ttl if ttl is not None else float(os.getenv("FITNESS_CACHE_TTL", "0"))
+        )
+        self.upstream_calls = 0
+        self.days_fetched = 0
+        self.days_from_cache = 0
+
+    def get(self, user_key: str, day: str) -> Optional[DayBucket]:
+        bucket = self.cache.get((user_key, day))
+        if bucket is not None:
+            self.days_from_cache += 1
+        return bucket
+
+    def put(self, user_key: str, day: str, bucket: DayBucket):
+        self.cache.set((user_key, day), bucket)
+
+    def record_fetch(self, days: int):
+        self.upstream_calls += 1
+        self.days_fetched += days
+
+    def stats(self) -> Dict:
+        return {
+            **self.cache.stats(),
+            "upstream_calls": self.upstream_calls,
+            "days_fetched": self.days_fetched,
+            "days_from_cache": self.days_from_cache,
+        }
@@ -0,0 +1,176 @@
+import asyncio
+import itertools
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from database.cache import LRUCache
+from database.fitness_store import FitnessStore
+from services.daily_summary import DailySummaryStore
+from services.fitness_cache import DailySummary, DayBucket, FitnessDayCache
+
+logger = logging.getLogger(__name__)
+
+DAY_FORMAT = '%Y-%m-%d'
+
+FetchDays = Callable[[str, datetime, datetime], Awaitable[Optional[Dict[str, DayBucket]]]]
+
+
+def _day(value: str) -> datetime:
+    return datetime.strptime(value, DAY_FORMAT)
+
+
+def _day_str(value: datetime) -> str:
+    return value.strftime(DAY_FORMAT)
+
+
+class FitnessSyncEngine:
+    """Incremental Google Fit sync backed by the local FitnessStore.
+
+    Each user has a synced range of closed days ``[earliest, high_water]``.
+    A sync only asks Google Fit for days after ``high_water`` (always
+    including the open day) and, when a longer window is requested, for the
+    history before ``earliest``. Ranges are split into pages of
+    FITNESS_SYNC_PAGE_DAYS days fetched concurrently, at most
+    FITNESS_SYNC_CONCURRENCY at a time. Marks only move when every page
+    succeeded, so the synced range never has holes.
+
+    ``generation(user_key)`` changes whenever a sync brings in a day whose
+    content differs from the last fetch of that day, so derived views can
+    be cached against it.
+
+    Newly stored closed days are also summarized in the background into
+    ``summaries``; ``sync_summaries`` serves a window from those rows and
+    only aggregates raw buckets for open days and days not yet summarized.
+    """
+
+    def __init__(self, fetch_days: FetchDays, store: Optional[FitnessStore] = None,
+                 day_cache: Optional[FitnessDayCache] = None, settle_hours: Optional[float] = None,
+                 page_days: Optional[int] = None, concurrency: Optional[int] = None,
+                 summaries: Optional[DailySummaryStore] = None):
+        self.fetch_days = fetch_days
+        self.store = store or FitnessStore()
+        self.day_cache = day_cache or FitnessDayCache()
+        self.summaries = summaries or DailySummaryStore(self.store)
+        self.settle_hours = settle_hours if settle_hours is not None else float(os.getenv("FITNESS_CACHE_SETTLE_HOURS", "6"))
+        self.page_days = page_days or int(os.getenv("FITNESS_SYNC_PAGE_DAYS", "30"))
+        self.concurrency = concurrency or int(os.getenv("FITNESS_SYNC_CONCURRENCY", "4"))
+        self.fingerprints = LRUCache(max_size=self.day_cache.cache.max_size)
+        self.generations = LRUCache(max_size=self.day_cache.cache.max_size)
+        self._generation_counter = itertools.count(1)
+
+    def generation(self, user_key: str) -> int:
+        return self.generations.get(user_key, 0)
+
+    def _track_changes(self, user_key: str, fetched: Dict[str, DayBucket]):
+        changed = False
+        for day, bucket in fetched.items():
+            fingerprint = hash(json.dumps(bucket.to_payload()))
+            if self.fingerprints.get((user_key, day)) != fingerprint:
+                self.fingerprints.set((user_key, day), fingerprint)
+                changed = True
+        if changed:
+            self.generations.set(user_key, next(self._generation_counter))
+
+    def last_closed_day(self, now: datetime) -> datetime:
+        """Latest day that ended at least settle_hours ago; later days may still change"""
+        settled = now - timedelta(hours=self.settle_hours)
+        return settled.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=1)
+
+    def _pages(self, start: datetime, end: datetime) -> List[Tuple[datetime, datetime]]:
+        pages = []
+        while start <= end:
+            page_end = min(start + timedelta(days=self.page_days - 1), end)
+            pages.append((start, page_end))
+            start = page_end + timedelta(days=1)
+        return pages
+
+    async def _fetch_pages(self, token: str, pages: List[Tuple[datetime, datetime]], now: datetime) -> Optional[Dict[str, DayBucket]]:
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def fetch(first: datetime, last: datetime):
+            async with semaphore:
+                return await self.fetch_days(token, first, min(last + timedelta(days=1), now))
+
+        # A page that raised (timeout, connection error) fails like a non-200
+        # one: the sync is incomplete, but stored days can still be served
+        results = await asyncio.gather(*(fetch(first, last) for first, last in pages), return_exceptions=True)
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            logger.warning("Google Fit page fetch failed", extra={"pages": len(errors), "error": repr(errors[0])})
+        if errors or any(result is None for result in results):
+            return None
+        merged: Dict[str, DayBucket] = {}
+        for result in results:
+            merged.update(result)
+        return merged
+
+    async def _refresh(self, user_key: str, token: str, days: int, now: datetime) -> Tuple[List[str], Dict[str, DayBucket]]:
+        """Fetch what the store lacks for the window; returns the window's days and the fetched buckets"""
+        today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+        window_start = today - timedelta(days=days - 1)
+        last_closed = self.last_closed_day(now)
+
+        earliest, high_water = await asyncio.to_thread(self.store.get_sync_state, user_key)
+        if earliest is None:
+            pages = self._pages(window_start, today)
+        else:
+            pages = self._pages(_day(high_water) + timedelta(days=1), today)
+            if window_start < _day(earliest):
+                pages += self._pages(window_start, _day(earliest) - timedelta(days=1))
+
+        fetched = await self._fetch_pages(token, pages, now)
+        if fetched is None:
+            logger.warning("Google Fit sync incomplete, serving stored days only", extra={"user_key": user_key})
+            fetched = {}
+        else:
+            self._track_changes(user_key, fetched)
+            closed = {day: bucket for day, bucket in fetched.items() if _day(day) <= last_closed}
+            new_earliest = min(window_start, _day(earliest)) if earliest else window_start
+            new_high_water = max(last_closed, _day(high_water)) if high_water else last_closed
+            await asyncio.to_thread(self.store.save_days, user_key, closed, _day_str(new_earliest), _day_str(new_high_water))
+            for day, bucket in closed.items():
+                self.day_cache.put(user_key, day, bucket)
+            self.summaries.materialize(user_key, closed)
+
+        window = [_day_str(window_start + timedelta(days=offset)) for offset in range(days)]
+        return window, fetched
+
+    async def _buckets(self, user_key: str, days: List[str], fetched: Dict[str, DayBucket]) -> Dict[str, DayBucket]:
+        buckets: Dict[str, DayBucket] = {}
+        missing = []
+        for day in days:
+            bucket = fetched.get(day) or self.day_cache.get(user_key, day)
+            if bucket is not None:
+                buckets[day] = bucket
+            else:
+                missing.append(day)
+
+        if missing:
+            stored = await asyncio.to_thread(self.store.load_days, user_key, missing)
+            for day, bucket in stored.items():
+                self.day_cache.put(user_key, day, bucket)
+                buckets[day] = bucket
+
+        return buckets
+
+    async def sync(self, user_key: str, token: str, days: int, now: Optional[datetime] = None) -> Dict[str, DayBucket]:
+        """Bring the user's store up to date and return the last ``days`` day buckets"""
+        window, fetched = await self._refresh(user_key, token, days, now or datetime.now())
+        return await self._buckets(user_key, window, fetched)
+
+    async def sync_summaries(self, user_key: str, token: str, days: int, now: Optional[datetime] = None) -> List[DailySummary]:
+        """Bring the user's store up to date and return summaries of the last ``days`` days, oldest first"""
+        window, fetched = await self._refresh(user_key, token, days, now or datetime.now())
+        summaries = {day: DailySummary.from_bucket(day, fetched[day]) for day in window if day in fetched}
+        summaries.update(await self.summaries.load(user_key, [day for day in window if day not in summaries]))
+
+        # Closed days stored before their summary was written
+        unsummarized = await self._buckets(user_key, [day for day in window if day not in summaries], {})
+        if unsummarized:
+            self.summaries.materialize(user_key, unsummarized)
+            for day, bucket in unsummarized.items():
+                summaries[day] = DailySummary.from_bucket(day, bucket)
+
+        return [summaries[day] for day in window if day in summaries]
@@ -0,0 +1,185 @@
+import asyncio
+import hashlib
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+from urllib.parse import urlencode
+from fastapi import HTTPException
+from database.cache import LRUCache
+from services.http_client import get_http_client
+from services.single_flight import SingleFlight
+from services.metrics import observe_upstream
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_TOKEN_URI = 'https://oauth2.googleapis.com/token'
+AUTHORIZE_URI = 'https://accounts.google.com/o/oauth2/v2/auth'
+FIT_SCOPES = [
+    'https://www.googleapis.com/auth/fitness.activity.read',
+    'https://www.googleapis.com/auth/fitness.heart_rate.read',
+    'https://www.googleapis.com/auth/fitness.sleep.read'
+]
+
+
+def user_key(credentials_dict: dict) -> str:
+    """Stable per-user key; the refresh token outlives access tokens"""
+    secret = credentials_dict.get('refresh_token') or credentials_dict.get('token') or ''
+    return hashlib.sha256(secret.encode()).hexdigest()[:32]
+
+
+def parse_expiry(credentials_dict: dict) -> Optional[datetime]:
+    """Expiry as naive UTC, the same convention google-auth uses"""
+    expiry = credentials_dict.get('expiry')
+    if not expiry:
+        return None
+    try:
+        parsed = datetime.fromisoformat(expiry.replace('Z', '+00:00'))
+    except ValueError as e:
+        logger.warning("Unparseable credentials expiry", extra={"error": str(e)})
+        return None
+    if parsed.tzinfo is not None:
+        parsed = parsed.replace(tzinfo=None) - parsed.utcoffset()
+    return parsed
+
+
+class GoogleOAuthClient:
+    """Authorization-code flow for one Google OAuth client and redirect URI"""
+
+    def __init__(self, client_id: str, client_secret: str, redirect_uri: str, scopes: Optional[List[str]] = None):
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.redirect_uri = redirect_uri
+        self.scopes = scopes or FIT_SCOPES
+
+    def get_auth_url(self, state: str) -> str:
+        params = {
+            'client_id': self.client_id,
+            'redirect_uri': self.redirect_uri,
+            'response_type': 'code',
+            'scope': ' '.join(self.scopes),
+            'access_type': 'offline',
+            'include_granted_scopes': 'true',
+            'prompt': 'consent',
+            'state': state
+        }
+        return f"{AUTHORIZE_URI}?{urlencode(params)}"
+
+    async def exchange_code_for_token(self, code: str) -> dict:
+        response = await observe_upstream("google_oauth", "authorization_code", get_http_client().post(
+            DEFAULT_TOKEN_URI,
+            data={
+                'grant_type': 'authorization_code',
+                'code': code,
+                'redirect_uri': self.redirect_uri,
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+            }
+        ))
+
+        if response.status_code != 200:
+            raise HTTPException(status_code=400, detail="Failed to exchange code for token")
+
+        return response.json()
+
+
+class GoogleTokenManager:
+    """Keeps Google access tokens fresh without blocking the event loop.
+
+    Tokens are refreshed with an async POST to the token endpoint on the
+    shared HTTP client. A token expiring within GOOGLE_TOKEN_REFRESH_MARGIN
+    seconds (default 300) is renewed in the background while the still
+    valid one is returned. Only expired tokens, or tokens within
+    GOOGLE_TOKEN_BLOCKING_MARGIN seconds (default 30), make the caller
+    wait. Refreshes are single-flight per user, and the newest credentials
+    are cached per user so every caller picks up the renewed token.
+    """
+
+    def __init__(self, refresh_margin: Optional[float] = None, blocking_margin: Optional[float] = None,
+                 cache_size: Optional[int] = None):
+        self.refresh_margin = timedelta(seconds=refresh_margin if refresh_margin is not None else float(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "300")))
+        self.blocking_margin = timedelta(seconds=blocking_margin if blocking_margin is not None else float(os.getenv("GOOGLE_TOKEN_BLOCKING_MARGIN", "30")))
+        self.cache = LRUCache(max_size=cache_size if cache_size is not None else int(os.getenv("GOOGLE_TOKEN_CACHE_SIZE", "10000")))
+        self.single_flight = SingleFlight()
+        self._background: Set[asyncio.Task] = set()
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def latest(self, credentials_dict: dict) -> dict:
+        """The newest known credentials for this user: cached or the given ones"""
+        cached = self.cache.get(user_key(credentials_dict))
+        if cached is None:
+            return credentials_dict
+        cached_expiry, given_expiry = parse_expiry(cached), parse_expiry(credentials_dict)
+        if given_expiry is not None and (cached_expiry is None or given_expiry > cached_expiry):
+            return credentials_dict
+        return cached
+
+    async def get_credentials(self, credentials_dict: dict) -> dict:
+        credentials_dict = self.latest(credentials_dict)
+        if not credentials_dict.get('refresh_token'):
+            return credentials_dict
+
+        expiry = parse_expiry(credentials_dict)
+        remaining = expiry - datetime.utcnow() if expiry else None
+
+        if remaining is not None and remaining <= self.blocking_margin:
+            return await self.refresh(credentials_dict)
+        if remaining is not None and remaining <= self.refresh_margin:
+            self._refresh_in_background(credentials_dict)
+        return credentials_dict
+
+    def _refresh_in_background(self, credentials_dict: dict):
+        async def run():
+            try:
+                await self.refresh(credentials_dict)
+            except HTTPException:
+                pass  # the token is still valid; the next call retries
+
+        task = asyncio.ensure_future(run())
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def refresh(self, credentials_dict: dict) -> dict:
+        key = user_key(credentials_dict)
+        return await self.single_flight.do(('refresh', key), lambda: self._refresh(key, credentials_dict))
+
+    async def _refresh(self, key: str, credentials_dict: dict) -> dict:
+        logger.info("Refreshing expiring Google credentials")
+        try:
+            response = await observe_upstream("google_oauth", "refresh_token", get_http_client().post(
+                credentials_dict.get('token_uri') or DEFAULT_TOKEN_URI,
+                data={
+                    'grant_type': 'refresh_token',
+                    'refresh_token': credentials_dict['refresh_token'],
+                    'client_id': credentials_dict['client_id'],
+                    'client_secret': credentials_dict['client_secret'],
+                }
+            ))
+            response.raise_for_status()
+            token_data = response.json()
+        except Exception as e:
+            self.refresh_failures += 1
+            logger.warning("Failed to refresh Google credentials", extra={"error": str(e)})
+            raise HTTPException(status_code=401, detail="Failed to refresh credentials")
+
+        refreshed = dict(credentials_dict)
+        refreshed['token'] = token_data['access_token']
+        refreshed['expiry'] = (datetime.utcnow() + timedelta(seconds=token_data.get('expires_in', 3600))).isoformat()
+        if token_data.get('refresh_token'):
+            refreshed['refresh_token'] = token_data['refresh_token']
+
+        self.refreshes += 1
+        self.cache.set(key, refreshed)
+        return refreshed
+
+    def stats(self) -> dict:
+        return {
+            **self.single_flight.stats(),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "cached_users": len(self.cache),
+        }
+
+
+google_token_manager = GoogleTokenManager()
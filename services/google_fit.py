@@ -1,28 +1,47 @@
+import logging
 import os
+import math
 import httpx
 from fastapi import HTTPException
-from typing import List, Tuple, Optional
-from datetime import datetime, timedelta
-import requests
-from google.oauth2.credentials import Credentials
-from google.auth.transport.requests import Request as GoogleRequest
-from models.fitness import StepData, HeartRateData, SleepData
+from typing import TYPE_CHECKING, Dict, List, Tuple, Optional
+from datetime import datetime
+from models.timeseries import TimeSeries
+from services.http_client import get_http_client
+from services.fitness_cache import DailySummary, DayBucket
+from services.fitness_sync import FitnessSyncEngine
+from services.single_flight import SingleFlight
+from services.metrics import observe_upstream
+from services.google_auth import FIT_SCOPES, GoogleTokenManager, google_token_manager, parse_expiry, user_key
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+logger = logging.getLogger(__name__)
+
+# Overridable so load tests can point at a local stand-in
+GOOGLE_FIT_API_URL = os.getenv("GOOGLE_FIT_API_URL", "https://www.googleapis.com/fitness/v1")
 
 class GoogleFitService:
-    def __init__(self):
-        self.scopes = [
-            'https://www.googleapis.com/auth/fitness.activity.read',
-            'https://www.googleapis.com/auth/fitness.heart_rate.read',
-            'https://www.googleapis.com/auth/fitness.sleep.read'
-        ]
+    def __init__(self, http_client: Optional[httpx.AsyncClient] = None, token_manager: Optional[GoogleTokenManager] = None):
+        self._http_client = http_client
+        self.token_manager = token_manager or google_token_manager
+        self.sync_engine = FitnessSyncEngine(self._fetch_days)
+        self.day_cache = self.sync_engine.day_cache
+        self.window_days = int(os.getenv("FITNESS_WINDOW_DAYS", "7"))
+        self.single_flight = SingleFlight()
+        self.scopes = FIT_SCOPES
+    
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self._http_client or get_http_client()
     
-    def credentials_from_dict(self, creds_dict: dict) -> Credentials:
-        expiry = None
-        if creds_dict.get('expiry'):
-            try:
-                expiry = datetime.fromisoformat(creds_dict['expiry'].replace('Z', '+00:00'))
-            except Exception as e:
-                print(f"Error parsing expiry date: {e}")
+    def credentials_from_dict(self, creds_dict: dict) -> "Credentials":
+        # google-auth is imported on first use rather than at startup
+        from google.oauth2.credentials import Credentials
+        
+        # Prefer a token the refresh manager has already renewed for this user
+        creds_dict = self.token_manager.latest(creds_dict)
+        expiry = parse_expiry(creds_dict)
         
         return Credentials(
             token=creds_dict['token'],
@@ -34,7 +53,7 @@ class GoogleFitService:
             expiry=expiry
         )
     
-    def credentials_to_dict(self, credentials: Credentials) -> dict:
+    def credentials_to_dict(self, credentials: "Credentials") -> dict:
         return {
             'token': credentials.token,
             'refresh_token': credentials.refresh_token,
@@ -45,29 +64,35 @@ class GoogleFitService:
             'expiry': credentials.expiry.isoformat() if credentials.expiry else None
         }
     
-    def refresh_credentials_if_needed(self, creds: Credentials) -> Credentials:
-        if creds.expired and creds.refresh_token:
-            try:
-                print("Refreshing expired credentials...")
-                creds.refresh(GoogleRequest())
-                return creds
-            except Exception as e:
-                print(f"Failed to refresh credentials: {e}")
-                raise HTTPException(status_code=401, detail="Failed to refresh credentials")
-        return creds
+    def user_key(self, credentials_dict: dict) -> str:
+        """Stable per-user cache key; the refresh token outlives access tokens"""
+        return user_key(credentials_dict)
     
-    async def get_fitness_data(self, credentials_dict: dict) -> Tuple[List[StepData], List[HeartRateData], List[SleepData]]:
-        creds = self.credentials_from_dict(credentials_dict)
-        creds = self.refresh_credentials_if_needed(creds)
-        
-        # Prepare time range (last 7 days)
-        end_time = datetime.now()
-        start_time = end_time - timedelta(days=7)
-        start_time_millis = int(start_time.timestamp() * 1000)
-        end_time_millis = int(end_time.timestamp() * 1000)
-
+    def _parse_buckets(self, fit_data: dict) -> Dict[str, DayBucket]:
+        days: Dict[str, DayBucket] = {}
+        for bucket in fit_data.get('bucket', []):
+            bucket_start = datetime.fromtimestamp(int(bucket['startTimeMillis']) / 1000)
+            date_str = bucket_start.strftime('%Y-%m-%d')
+            day = days.setdefault(date_str, DayBucket())
+            
+            for dataset in bucket.get('dataset', []):
+                source = dataset.get('dataSourceId', '')
+                
+                for point in dataset.get('point', []):
+                    if 'step_count' in source:
+                        day.steps.append(date_str, point['value'][0].get('intVal', 0))
+                    elif 'heart_rate' in source:
+                        day.heart_rate.append(date_str, round(point['value'][0].get('fpVal', 0.0), 1))
+                    elif 'sleep' in source:
+                        # Segment length is kept for sleep-stage durations
+                        duration = (int(point.get('endTimeNanos', 0)) - int(point.get('startTimeNanos', 0))) / 1e9
+                        day.sleep.append(date_str, point['value'][0].get('intVal', -1), duration)
+        return days
+    
+    async def _fetch_days(self, token: str, start_time: datetime, end_time: datetime) -> Optional[Dict[str, DayBucket]]:
+        """One dataset:aggregate call with 24h buckets; None if Google Fit did not return 200"""
         headers = {
-            'Authorization': f'Bearer {creds.token}',
+            'Authorization': f'Bearer {token}',
             'Content-Type': 'application/json'
         }
 
@@ -78,51 +103,73 @@ class GoogleFitService:
                 {"dataTypeName": "com.google.sleep.segment"}
             ],
             "bucketByTime": {"durationMillis": 86400000},  # 24 hours
-            "startTimeMillis": start_time_millis,
-            "endTimeMillis": end_time_millis
+            "startTimeMillis": int(start_time.timestamp() * 1000),
+            "endTimeMillis": int(end_time.timestamp() * 1000)
         }
 
-        step_data, heart_rate_data, sleep_data = [], [], []
+        response = await observe_upstream("google_fit", "dataset:aggregate", self.http_client.post(
+            f'{GOOGLE_FIT_API_URL}/users/me/dataset:aggregate',
+            headers=headers,
+            json=data,
+            timeout=30
+        ))
+        self.day_cache.record_fetch(max(1, math.ceil((end_time - start_time).total_seconds() / 86400)))
+
+        if response.status_code != 200:
+            logger.warning("Google Fit API returned an error", extra={"status": response.status_code})
+            return None
+        return self._parse_buckets(response.json())
+    
+    async def get_fitness_data(self, credentials_dict: dict, days: Optional[int] = None) -> Tuple[TimeSeries, TimeSeries, TimeSeries, dict]:
+        # Concurrent polls for the same user and window share one fetch
+        days = days or self.window_days
+        return await self.single_flight.do(
+            (self.user_key(credentials_dict), days),
+            lambda: self._get_fitness_data(credentials_dict, days)
+        )
+    
+    async def _get_fitness_data(self, credentials_dict: dict, days: int) -> Tuple[TimeSeries, TimeSeries, TimeSeries, dict]:
+        # Renews ahead of expiry without blocking on a synchronous round-trip
+        credentials_dict = await self.token_manager.get_credentials(credentials_dict)
+        creds = self.credentials_from_dict(credentials_dict)
         
+        # Last `days` calendar days (FITNESS_WINDOW_DAYS by default), today
+        # included. Closed days come from the local store; Google Fit is only
+        # asked for days past the user's sync high-water mark or before the
+        # earliest synced day.
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(
-                    'https://www.googleapis.com/fitness/v1/users/me/dataset:aggregate',
-                    headers=headers,
-                    json=data,
-                    timeout=30
-                )
-
-            if response.status_code == 200:
-                fit_data = response.json()
-
-                for bucket in fit_data.get('bucket', []):
-                    bucket_start = datetime.fromtimestamp(int(bucket['startTimeMillis']) / 1000)
-                    date_str = bucket_start.strftime('%Y-%m-%d')
-                    
-                    for dataset in bucket.get('dataset', []):
-                        source = dataset.get('dataSourceId', '')
-                        
-                        for point in dataset.get('point', []):
-                            if 'step_count' in source:
-                                steps = point['value'][0].get('intVal', 0)
-                                step_data.append(StepData(date=date_str, steps=steps))
-                            elif 'heart_rate' in source:
-                                bpm = point['value'][0].get('fpVal', 0.0)
-                                heart_rate_data.append(HeartRateData(date=date_str, bpm=round(bpm, 1)))
-                            elif 'sleep' in source:
-                                stage = point['value'][0].get('intVal', -1)
-                                sleep_data.append(SleepData(date=date_str, stage=stage))
-
-                # Sort data by date
-                step_data.sort(key=lambda x: x.date)
-                heart_rate_data.sort(key=lambda x: x.date)
-                sleep_data.sort(key=lambda x: x.date)
-
-        except Exception as e:
-            print(f"Google Fit API error: {e}")
+            buckets = await self.sync_engine.sync(self.user_key(credentials_dict), creds.token, days)
+        except Exception:
+            logger.exception("Google Fit sync failed")
             raise HTTPException(status_code=500, detail="Failed to fetch fitness data")
 
+        step_data, heart_rate_data, sleep_data = TimeSeries.steps(), TimeSeries.heart_rate(), TimeSeries.sleep()
+        for date_str in sorted(buckets):
+            bucket = buckets[date_str]
+            step_data.extend(bucket.steps)
+            heart_rate_data.extend(bucket.heart_rate)
+            sleep_data.extend(bucket.sleep)
+
         return step_data, heart_rate_data, sleep_data, self.credentials_to_dict(creds)
+    
+    async def get_daily_summaries(self, credentials_dict: dict, days: Optional[int] = None) -> Tuple[List[DailySummary], dict]:
+        """Per-day totals for the window, read from materialized summaries where possible"""
+        days = days or self.window_days
+        return await self.single_flight.do(
+            (self.user_key(credentials_dict), days, 'summaries'),
+            lambda: self._get_daily_summaries(credentials_dict, days)
+        )
+    
+    async def _get_daily_summaries(self, credentials_dict: dict, days: int) -> Tuple[List[DailySummary], dict]:
+        credentials_dict = await self.token_manager.get_credentials(credentials_dict)
+        creds = self.credentials_from_dict(credentials_dict)
+        
+        try:
+            summaries = await self.sync_engine.sync_summaries(self.user_key(credentials_dict), creds.token, days)
+        except Exception:
+            logger.exception("Google Fit sync failed")
+            raise HTTPException(status_code=500, detail="Failed to fetch fitness data")
+        
+        return summaries, self.credentials_to_dict(creds)
 
 google_fit_service = GoogleFitService()
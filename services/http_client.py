@@ -0,0 +1,60 @@
+import logging
+import os
+from typing import Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def create_http_client() -> httpx.AsyncClient:
+    """Build the pooled client shared by every upstream service.
+
+    Tunables: HTTP_MAX_CONNECTIONS, HTTP_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_KEEPALIVE_EXPIRY (seconds), HTTP_TIMEOUT (seconds) and HTTP2.
+    """
+    http2 = os.getenv("HTTP2", "true").lower() == "true"
+    if http2 and not _http2_available():
+        logger.warning("HTTP/2 requested but the h2 package is not installed, using HTTP/1.1")
+        http2 = False
+
+    return httpx.AsyncClient(
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=int(os.getenv("HTTP_MAX_CONNECTIONS", "100")),
+            max_keepalive_connections=int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20")),
+            keepalive_expiry=float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30")),
+        ),
+        timeout=float(os.getenv("HTTP_TIMEOUT", "5")),
+    )
+
+
+async def start_http_client() -> httpx.AsyncClient:
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Return the application-scoped client, creating it on first use outside the lifespan"""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = create_http_client()
+    return _client
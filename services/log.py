@@ -0,0 +1,57 @@
+import json
+import logging
+import os
+import sys
+from contextvars import ContextVar
+from typing import Optional
+
+# Set per request by MetricsMiddleware and added to every log line
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class JSONFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, event, request id and any ``extra`` fields"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "event": record.getMessage(),
+        }
+        current_request = request_id.get()
+        if current_request:
+            entry["request_id"] = current_request
+        entry.update((key, value) for key, value in vars(record).items() if key not in _RECORD_FIELDS)
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines with the ``extra`` fields appended as key=value"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = [f"{key}={value}" for key, value in vars(record).items() if key not in _RECORD_FIELDS]
+        current_request = request_id.get()
+        if current_request:
+            fields.insert(0, f"request_id={current_request}")
+        line = super().format(record)
+        return f"{line} {' '.join(fields)}" if fields else line
+
+
+def configure_logging():
+    """Send application logs to stderr as LOG_FORMAT (json | text) at LOG_LEVEL (default INFO)"""
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(JSONFormatter() if os.getenv("LOG_FORMAT", "json").lower() == "json" else TextFormatter())
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+    # httpx logs every request at INFO; upstream calls are already metrics
+    for noisy in ("httpx", "httpcore"):
+        logging.getLogger(noisy).setLevel(logging.WARNING)
@@ -0,0 +1,302 @@
+import asyncio
+import bisect
+import functools
+import os
+import threading
+import time
+import uuid
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+import httpx
+from starlette.routing import Match
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from services.log import request_id
+
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# (labels, value) pairs of one metric family
+Samples = List[Tuple[Dict[str, str], float]]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{_escape(str(value))}"' for key, value in labels.items()) + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(label_names)
+        self._lock = threading.Lock()
+
+    def _key(self, label_values: Sequence[str]) -> tuple:
+        if len(label_values) != len(self.label_names):
+            raise ValueError(f"{self.name} takes labels {self.label_names}")
+        return tuple(str(value) for value in label_values)
+
+    def render(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [f"{self.name}{_labels(dict(zip(self.label_names, key)))} {value}" for key, value in values]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value: float, *label_values: str):
+        key = self._key(label_values)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        super().__init__(name, help_text, label_names)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (+Inf last), sum]
+        self._values: Dict[tuple, list] = {}
+
+    def observe(self, value: float, *label_values: str):
+        key = self._key(label_values)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, counts, total in values:
+            labels = dict(zip(self.label_names, key))
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels({**labels, 'le': le})} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_labels(labels)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Process-local metrics rendered in the Prometheus text format.
+
+    Metrics are updated on the hot path; collectors are called at scrape
+    time for figures that are already counted elsewhere (cache stats).
+    """
+
+    def __init__(self):
+        self.metrics: List[_Metric] = []
+        self.collectors: List[Callable[[], Iterable[Tuple[str, str, str, Samples]]]] = []
+
+    def _add(self, metric: _Metric) -> _Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._add(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._add(Gauge(name, help_text, labels))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram(name, help_text, labels, buckets))
+
+    def register_collector(self, collect: Callable[[], Iterable[Tuple[str, str, str, Samples]]]):
+        """``collect()`` yields (name, kind, help, samples) per metric family"""
+        self.collectors.append(collect)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines += [f"# HELP {metric.name} {metric.help}", f"# TYPE {metric.name} {metric.kind}"]
+            lines += metric.render()
+
+        # Families may be spread over several collectors (one per cache)
+        families: Dict[str, Tuple[str, str, Samples]] = {}
+        for collect in self.collectors:
+            for name, kind, help_text, samples in collect():
+                families.setdefault(name, (kind, help_text, []))[2].extend(samples)
+        for name, (kind, help_text, samples) in families.items():
+            lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+            lines += [f"{name}{_labels(labels)} {value}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUESTS = registry.counter("http_requests_total", "HTTP requests handled", ("method", "route", "status"))
+HTTP_DURATION = registry.histogram("http_request_duration_seconds", "Time to the end of the response body", ("method", "route"))
+UPSTREAM_REQUESTS = registry.counter("upstream_requests_total", "Calls to Google and Spotify APIs", ("service", "endpoint", "status"))
+UPSTREAM_DURATION = registry.histogram("upstream_request_duration_seconds", "Upstream call latency", ("service", "endpoint"))
+STORAGE_DURATION = registry.histogram("storage_operation_duration_seconds", "Time spent in a storage operation", ("store", "operation"))
+STORAGE_QUEUE_WAIT = registry.histogram("storage_queue_wait_seconds", "Wait for a storage worker thread", ("store",))
+LOOP_LAG = registry.histogram("event_loop_lag_seconds", "Delay of event-loop wake-ups past their schedule",
+                              buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+
+
+async def observe_upstream(service: str, endpoint: str, request: Awaitable[httpx.Response]) -> httpx.Response:
+    """Await an upstream call, recording its duration and status ("error" if it raised)"""
+    started = time.perf_counter()
+    status = "error"
+    try:
+        response = await request
+        status = str(response.status_code)
+        return response
+    finally:
+        UPSTREAM_DURATION.observe(time.perf_counter() - started, service, endpoint)
+        UPSTREAM_REQUESTS.inc(service, endpoint, status)
+
+
+def observe_storage(store: str):
+    """Decorator timing a blocking storage method"""
+    def decorate(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                STORAGE_DURATION.observe(time.perf_counter() - started, store, fn.__name__)
+        return timed
+    return decorate
+
+
+CACHE_METRICS = {
+    "hits": ("cache_hits_total", "counter", "Cache lookups served from cache"),
+    "misses": ("cache_misses_total", "counter", "Cache lookups that missed"),
+    "evictions": ("cache_evictions_total", "counter", "Entries evicted for size"),
+    "size": ("cache_entries", "gauge", "Entries currently cached"),
+}
+
+SINGLE_FLIGHT_METRICS = {
+    "calls": ("single_flight_calls_total", "counter", "Calls that started an upstream fetch"),
+    "collapsed": ("single_flight_collapsed_total", "counter", "Calls that joined a fetch already in flight"),
+    "in_flight": ("single_flight_in_flight", "gauge", "Fetches currently in flight"),
+}
+
+
+def register_stats(stats: Callable[[], Dict], metrics: Dict[str, Tuple[str, str, str]], labels: Optional[Dict[str, str]] = None):
+    """Expose keys of a ``stats()`` dict at scrape time; ``metrics`` maps a key to (name, kind, help)"""
+    labels = labels or {}
+
+    def collect():
+        current = stats()
+        for key, (name, kind, help_text) in metrics.items():
+            yield name, kind, help_text, [(labels, current[key])]
+    registry.register_collector(collect)
+
+
+def register_cache(name: str, stats: Callable[[], Dict]):
+    """Expose an LRUCache-style ``stats()`` as cache_* metrics labelled ``cache=name``"""
+    register_stats(stats, CACHE_METRICS, {"cache": name})
+
+
+def register_single_flight(name: str, stats: Callable[[], Dict]):
+    """Expose a SingleFlight's ``stats()`` as single_flight_* metrics labelled ``group=name``"""
+    register_stats(stats, SINGLE_FLIGHT_METRICS, {"group": name})
+
+
+async def monitor_event_loop(interval: Optional[float] = None):
+    """Record how late the loop wakes up from a sleep of ``interval`` seconds (EVENT_LOOP_LAG_INTERVAL, default 0.5)"""
+    interval = interval or float(os.getenv("EVENT_LOOP_LAG_INTERVAL", "0.5"))
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        LOOP_LAG.observe(max(0.0, time.perf_counter() - started - interval))
+
+
+def _route(scope: Scope, root_path: str = "") -> str:
+    """Full path template of the matched route, so ids in URLs do not become labels.
+
+    Depending on the FastAPI version, a route included with a router
+    prefix reports its path with or without that prefix. The prefix is
+    recovered from the request path: it is whatever comes before the part
+    the route's own pattern matches.
+    """
+    route = scope.get("route")
+    if route is None and "app" in scope:
+        for candidate in scope["app"].router.routes:
+            if candidate.matches(scope)[0] == Match.FULL:
+                route = candidate
+                break
+    template = getattr(route, "path", None)
+    if template is None:
+        return "unmatched"
+    pattern = getattr(route, "path_regex", None)
+    path = scope["path"]
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    if pattern is not None:
+        for index, char in enumerate(path):
+            if char == "/" and pattern.match(path[index:]):
+                return path[:index] + template
+    return template
+
+
+class MetricsMiddleware:
+    """Counts and times every HTTP request by method, route template and status.
+
+    Each request gets an id (the incoming X-Request-ID or a new one) that
+    is echoed in the response and attached to its log lines.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        root_path = scope.get("root_path", "")
+        incoming = dict(scope["headers"]).get(b"x-request-id")
+        current_request = incoming.decode("latin-1")[:64] if incoming else uuid.uuid4().hex
+        token = request_id.set(current_request)
+        started = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+                MutableHeaders(scope=message).append("X-Request-ID", current_request)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = _route(scope, root_path)
+            HTTP_DURATION.observe(time.perf_counter() - started, scope["method"], route)
+            HTTP_REQUESTS.inc(scope["method"], route, status)
+            request_id.reset(token)
@@ -0,0 +1,56 @@
+import os
+from typing import Callable, Dict, Mapping, Optional, Tuple
+from fastapi import HTTPException
+from services.google_auth import GoogleOAuthClient
+from services.spotify import SpotifyService
+
+PLATFORMS = ('web', 'mobile')
+MOBILE_REDIRECT_URI = "emotionwellbeing://auth-success"
+WEB_REDIRECT_URI = "http://127.0.0.1:5000/auth/callback"
+
+# (provider, platform) -> env vars for client id, secret and redirect URI, and the URI default
+PROVIDER_ENV: Dict[Tuple[str, str], Tuple[str, str, str, str]] = {
+    ("spotify", "web"): ("SPOTIFY_CLIENT_ID", "SPOTIFY_CLIENT_SECRET", "SPOTIFY_REDIRECT_URI", WEB_REDIRECT_URI),
+    ("spotify", "mobile"): ("SPOTIFY_MOBILE_CLIENT_ID", "SPOTIFY_MOBILE_CLIENT_SECRET", "SPOTIFY_MOBILE_REDIRECT_URI", MOBILE_REDIRECT_URI),
+    ("google", "web"): ("GOOGLE_CLIENT_ID", "GOOGLE_CLIENT_SECRET", "GOOGLE_REDIRECT_URI", WEB_REDIRECT_URI),
+    ("google", "mobile"): ("GOOGLE_MOBILE_CLIENT_ID", "GOOGLE_MOBILE_CLIENT_SECRET", "GOOGLE_MOBILE_REDIRECT_URI", MOBILE_REDIRECT_URI),
+}
+
+CLIENT_FACTORIES: Dict[str, Callable[[str, str, str], object]] = {
+    "spotify": lambda client_id, client_secret, redirect_uri: SpotifyService(client_id, client_secret, redirect_uri=redirect_uri),
+    "google": GoogleOAuthClient,
+}
+
+
+class OAuthProviderRegistry:
+    """OAuth clients for every (provider, platform), built once.
+
+    Configuration is read from the environment when the registry is
+    created and each client is constructed then and reused for every
+    request. Clients expose ``redirect_uri``, ``get_auth_url(state)`` and
+    an async ``exchange_code_for_token(code)``. Any platform other than
+    "mobile" is served as "web".
+    """
+
+    def __init__(self, environ: Optional[Mapping[str, str]] = None):
+        environ = os.environ if environ is None else environ
+        self.clients = {}
+        for (provider, platform), (id_var, secret_var, uri_var, default_uri) in PROVIDER_ENV.items():
+            self.clients[provider, platform] = CLIENT_FACTORIES[provider](
+                environ.get(id_var), environ.get(secret_var), environ.get(uri_var, default_uri)
+            )
+
+    def get(self, provider: str, platform: str):
+        client = self.clients.get((provider, platform if platform == "mobile" else "web"))
+        if client is None:
+            raise HTTPException(status_code=400, detail="Invalid provider")
+        return client
+
+    def authorize_url(self, provider: str, platform: str, state: str) -> str:
+        return self.get(provider, platform).get_auth_url(state)
+
+    async def exchange_code(self, provider: str, platform: str, code: str) -> dict:
+        return await self.get(provider, platform).exchange_code_for_token(code)
+
+
+oauth_providers = OAuthProviderRegistry()
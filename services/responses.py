@@ -0,0 +1,88 @@
+import gzip
+import json
+import os
+from typing import Any, Mapping, Optional
+from fastapi import Request
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # stdlib json fallback
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # gzip only
+    brotli = None
+
+# Opt-in: handlers return FastJSONResponse instead of letting FastAPI
+# re-validate against response_model and run jsonable_encoder
+FAST_RESPONSES = os.getenv("FAST_RESPONSES", "false").lower() == "true"
+# Bodies at least this large are compressed when the client accepts it; 0 disables
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", "4096"))
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", "4"))
+
+
+def _default(obj: Any) -> Any:
+    if isinstance(obj, BaseModel):
+        return obj.dict()
+    raise TypeError(f"Type is not JSON serializable: {type(obj).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    """Compact JSON bytes; pydantic models are serialized as their dict"""
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, default=_default, ensure_ascii=False, separators=(',', ':')).encode()
+
+
+def negotiate_encoding(accept_encoding: str, size: int) -> Optional[str]:
+    """Content-Encoding to use for a body of ``size`` bytes, or None to send it as is"""
+    if COMPRESS_MIN_BYTES <= 0 or size < COMPRESS_MIN_BYTES:
+        return None
+    accepted = {part.split(';')[0].strip().lower() for part in accept_encoding.split(',')}
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered straight from already-validated content.
+
+    Uses orjson when installed, and compresses the body with brotli (when
+    installed) or gzip if it is large enough and ``accept_encoding`` allows.
+    """
+
+    def __init__(self, content: Any, status_code: int = 200, headers: Optional[Mapping[str, str]] = None,
+                 accept_encoding: str = "", **kwargs):
+        self.accept_encoding = accept_encoding
+        self.content_encoding: Optional[str] = None
+        super().__init__(content, status_code, headers, **kwargs)
+        if self.content_encoding:
+            self.headers["content-encoding"] = self.content_encoding
+            self.headers["vary"] = "Accept-Encoding"
+
+    def render(self, content: Any) -> bytes:
+        body = dumps(content)
+        encoding = negotiate_encoding(self.accept_encoding, len(body))
+        if encoding:
+            body = compress(body, encoding)
+            self.content_encoding = encoding
+        return body
+
+
+def respond(request: Request, content: Any, headers: Optional[Mapping[str, str]] = None) -> Any:
+    """``content`` as a FastJSONResponse when FAST_RESPONSES is on, else unchanged for FastAPI to encode"""
+    if not FAST_RESPONSES:
+        return content
+    return FastJSONResponse(content, headers=headers, accept_encoding=request.headers.get("accept-encoding", ""))
@@ -0,0 +1,113 @@
+import secrets
+from typing import Any, Dict, Optional
+from starlette.concurrency import run_in_threadpool
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from database.session_store import SessionStore
+
+
+class Session(dict):
+    """``request.session``: a dict that notes whether it was changed.
+
+    Assigning a value equal to the current one is not a change, so routes
+    that write back unchanged credentials do not cause a store write.
+    """
+
+    def __init__(self, data: Optional[Dict] = None):
+        super().__init__(data or {})
+        self.modified = False
+
+    def __setitem__(self, key: str, value: Any):
+        if key not in self or self[key] != value:
+            super().__setitem__(key, value)
+            self.modified = True
+
+    def __delitem__(self, key: str):
+        super().__delitem__(key)
+        self.modified = True
+
+    def pop(self, key: str, *default):
+        if key in self:
+            self.modified = True
+        return super().pop(key, *default)
+
+    def setdefault(self, key: str, default: Any = None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def clear(self):
+        if self:
+            self.modified = True
+        super().clear()
+
+
+class ServerSessionMiddleware:
+    """Drop-in for starlette's SessionMiddleware that keeps session data server-side.
+
+    The cookie carries only a random session id; the data lives in a
+    SessionStore. The store is written only when the session changed,
+    including changes made while a streaming response is being sent, and
+    the cookie is only re-sent when the session is written.
+    """
+
+    def __init__(self, app: ASGIApp, store: SessionStore, session_cookie: str = "session_id",
+                 max_age: int = 14 * 24 * 3600, path: str = "/", same_site: str = "lax", https_only: bool = False):
+        self.app = app
+        self.store = store
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.path = path
+        self.security_flags = f"httponly; samesite={same_site}" + ("; secure" if https_only else "")
+
+    async def _call(self, fn, *args):
+        if self.store.blocking:
+            return await run_in_threadpool(fn, *args)
+        return fn(*args)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id = HTTPConnection(scope).cookies.get(self.session_cookie)
+        data = await self._call(self.store.load, session_id) if session_id else None
+        if data is None:
+            session_id = None
+        session = Session(data)
+        scope["session"] = session
+
+        if scope["type"] == "websocket":
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message: Message):
+            nonlocal session_id
+            if message["type"] == "http.response.start":
+                headers = MutableHeaders(scope=message)
+                if session and (session.modified or session_id is None):
+                    session_id = session_id or secrets.token_urlsafe(32)
+                    session.modified = False
+                    await self._call(self.store.save, session_id, dict(session), self.max_age)
+                    headers.append("Set-Cookie", self._cookie(session_id, self.max_age))
+                elif not session and session_id is not None:
+                    await self._call(self.store.delete, session_id)
+                    session_id = None
+                    headers.append("Set-Cookie", self._cookie("null", 0))
+            elif message["type"] == "http.response.body" and not message.get("more_body", False):
+                # Changed after the headers went out (streaming responses)
+                if session.modified and session_id is not None:
+                    session.modified = False
+                    await self._call(self.store.save, session_id, dict(session), self.max_age)
+            await send(message)
+
+        await self.app(scope, receive, send_wrapper)
+
+    def _cookie(self, value: str, max_age: int) -> str:
+        expires = "expires=Thu, 01 Jan 1970 00:00:00 GMT; " if max_age == 0 else ""
+        return f"{self.session_cookie}={value}; path={self.path}; {expires}Max-Age={max_age}; {self.security_flags}"
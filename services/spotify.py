@@ -1,14 +1,88 @@
 import base64
-from typing import Optional, List
+import logging
+import math
+import os
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, List, Tuple
 import httpx
+import numpy as np
+from fastapi import HTTPException
 from models.fitness import SpotifyTrack
+from database.cache import LRUCache
+from services.http_client import get_http_client
+from services.single_flight import SingleFlight
+from services.metrics import observe_upstream
+
+logger = logging.getLogger(__name__)
+
+# Overridable so load tests can point at local stand-ins
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com/v1")
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+# The audio-features endpoint accepts at most 100 ids per request
+AUDIO_FEATURES_BATCH = 100
+AUDIO_SUMMARY_FIELDS = ('valence', 'energy', 'tempo')
+
+
+class SpotifyTokenExpired(Exception):
+    """Spotify rejected the access token (HTTP 401); it needs a refresh"""
+
+
+class SpotifyRateLimited(Exception):
+    """Spotify answered 429; no calls until the Retry-After window has passed"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Rate limited for {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+class RecentHistory:
+    """A user's recently played tracks, newest first, plus the `after` cursor"""
+
+    __slots__ = ('tracks', 'cursor', 'fetched_at', 'max_size')
+
+    def __init__(self, max_size: int = 50):
+        self.tracks: List[SpotifyTrack] = []
+        self.cursor: Optional[int] = None
+        self.fetched_at = 0.0
+        self.max_size = max_size
+
+    def merge(self, new_tracks: List[SpotifyTrack]):
+        self.fetched_at = time.monotonic()
+        if not new_tracks:
+            return
+        seen = {track.played_at for track in new_tracks}
+        self.tracks = (new_tracks + [t for t in self.tracks if t.played_at not in seen])[:self.max_size]
+        newest = datetime.fromisoformat(self.tracks[0].played_at.replace('Z', '+00:00'))
+        self.cursor = int(newest.timestamp() * 1000)
+
 
 class SpotifyService:
-    def __init__(self, client_id: str, client_secret: str):
+    def __init__(self, client_id: str, client_secret: str, http_client: Optional[httpx.AsyncClient] = None,
+                 redirect_uri: Optional[str] = None):
         self.client_id = client_id
         self.client_secret = client_secret
-        self.redirect_uri = 'https://emotion-wellbeing.onrender.com/spotify/callback'
+        self.redirect_uri = redirect_uri or 'https://emotion-wellbeing.onrender.com/spotify/callback'
         self.scopes = "user-read-playback-state user-read-recently-played"
+        self._http_client = http_client
+        # Concurrent identical reads for the same token share one upstream call
+        self.single_flight = SingleFlight()
+        cache_size = int(os.getenv("SPOTIFY_CACHE_SIZE", "10000"))
+        self.now_playing = LRUCache(max_size=cache_size)
+        self.now_playing_ttl = float(os.getenv("SPOTIFY_NOW_PLAYING_TTL", "5"))
+        self.recent_history = LRUCache(max_size=cache_size)
+        self.recent_ttl = float(os.getenv("SPOTIFY_RECENT_TTL", "30"))
+        self.history_size = int(os.getenv("SPOTIFY_HISTORY_SIZE", "50"))
+        self.default_backoff = float(os.getenv("SPOTIFY_DEFAULT_BACKOFF", "5"))
+        # Audio features never change, so they are kept until evicted
+        self.audio_features = LRUCache(max_size=int(os.getenv("SPOTIFY_FEATURE_CACHE_SIZE", "100000")))
+        self._backoff_until = 0.0
+        self.rate_limited = 0
+    
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        return self._http_client or get_http_client()
     
     def get_auth_url(self, state: str) -> str:
         from urllib.parse import urlencode
@@ -19,77 +93,226 @@ class SpotifyService:
             'scope': self.scopes,
             'state': state
         }
-        return f"https://accounts.spotify.com/authorize?{urlencode(params)}"
+        return f"{SPOTIFY_ACCOUNTS_URL}/authorize?{urlencode(params)}"
     
-    async def exchange_code_for_token(self, code: str) -> dict:
-        token_url = "https://accounts.spotify.com/api/token"
+    async def _token_request(self, data: dict):
+        token_url = f"{SPOTIFY_ACCOUNTS_URL}/api/token"
         auth_header = base64.b64encode(f"{self.client_id}:{self.client_secret}".encode()).decode()
 
-        data = {
-            'grant_type': 'authorization_code',
-            'code': code,
-            'redirect_uri': self.redirect_uri,
-        }
-
         headers = {
             'Authorization': f'Basic {auth_header}',
             'Content-Type': 'application/x-www-form-urlencoded'
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(token_url, data=data, headers=headers)
-            
+        return await observe_upstream("spotify_accounts", data['grant_type'], self.http_client.post(token_url, data=data, headers=headers))
+    
+    async def exchange_code_for_token(self, code: str) -> dict:
+        response = await self._token_request({
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': self.redirect_uri,
+        })
+
         if response.status_code != 200:
             raise HTTPException(status_code=400, detail="Failed to exchange code for token")
         
         return response.json()
     
+    async def refresh_access_token(self, refresh_token: str) -> dict:
+        response = await self._token_request({
+            'grant_type': 'refresh_token',
+            'refresh_token': refresh_token,
+        })
+
+        if response.status_code != 200:
+            raise HTTPException(status_code=401, detail="Failed to refresh Spotify token")
+        
+        return response.json()
+    
+    def _retry_after(self, value: Optional[str]) -> float:
+        """Seconds to back off for a Retry-After of delay-seconds or an HTTP-date"""
+        if value is None:
+            return self.default_backoff
+        try:
+            delay = float(value)
+        except ValueError:
+            try:
+                delay = (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                return self.default_backoff
+        return max(0.0, delay) if math.isfinite(delay) else self.default_backoff
+    
+    async def _api_get(self, path: str, access_token: str, params: Optional[dict] = None) -> httpx.Response:
+        """GET a Web API endpoint, honouring any Retry-After backoff in force"""
+        remaining = self._backoff_until - time.monotonic()
+        if remaining > 0:
+            raise SpotifyRateLimited(remaining)
+        
+        response = await observe_upstream("spotify", path, self.http_client.get(
+            f'{SPOTIFY_API_URL}{path}',
+            headers={'Authorization': f'Bearer {access_token}'},
+            params=params
+        ))
+        
+        if response.status_code == 429:
+            retry_after = self._retry_after(response.headers.get('Retry-After'))
+            self._backoff_until = time.monotonic() + retry_after
+            self.rate_limited += 1
+            logger.warning("Spotify rate limit hit, backing off", extra={"retry_after": retry_after})
+            raise SpotifyRateLimited(retry_after)
+        if response.status_code == 401:
+            raise SpotifyTokenExpired()
+        return response
+    
     async def get_current_track(self, access_token: str) -> Optional[SpotifyTrack]:
-        headers = {'Authorization': f'Bearer {access_token}'}
+        return await self.single_flight.do(
+            ('current_track', access_token),
+            lambda: self._get_current_track(access_token)
+        )
+    
+    async def _get_current_track(self, access_token: str) -> Optional[SpotifyTrack]:
+        # Served from cache for SPOTIFY_NOW_PLAYING_TTL seconds; a stale entry
+        # is still used while rate limited
+        cached = self.now_playing.get(access_token)
+        if cached is not None and time.monotonic() - cached[0] < self.now_playing_ttl:
+            return cached[1]
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    'https://api.spotify.com/v1/me/player/currently-playing',
-                    headers=headers
-                )
+            response = await self._api_get('/me/player/currently-playing', access_token)
             
-            if response.status_code == 200:
-                data = response.json()
+            if response.status_code in (200, 204):
+                track = None
+                data = response.json() if response.status_code == 200 and response.content else None
                 if data and data.get("item"):
-                    return SpotifyTrack(
+                    track = SpotifyTrack(
+                        id=data["item"].get("id"),
                         name=data["item"]["name"],
                         artist=data["item"]["artists"][0]["name"],
                         album=data["item"]["album"]["name"],
-                        image=data["item"]["album"]["images"][0]["url"] if data["item"]["album"]["images"] else None
+                        image=data["item"]["album"]["images"][0]["url"] if data["item"]["album"]["images"] else None,
+                        progress_ms=data.get("progress_ms"),
+                        duration_ms=data["item"].get("duration_ms"),
+                        is_playing=data.get("is_playing")
                     )
+                self.now_playing.set(access_token, (time.monotonic(), track))
+                return track
+        except SpotifyTokenExpired:
+            raise
+        except SpotifyRateLimited:
+            return cached[1] if cached is not None else None
         except Exception as e:
-            print(f"Error fetching current track: {e}")
+            logger.warning("Error fetching current track", extra={"error": str(e)})
         
         return None
     
-    async def get_recent_tracks(self, access_token: str, limit: int = 5) -> List[SpotifyTrack]:
-        headers = {'Authorization': f'Bearer {access_token}'}
-        tracks = []
+    async def get_recent_tracks(self, access_token: str, limit: int = 5, user_key: Optional[str] = None) -> List[SpotifyTrack]:
+        # History is kept per user so it survives token refreshes
+        key = user_key or access_token
+        tracks = await self.single_flight.do(
+            ('recent_tracks', key),
+            lambda: self._sync_recent_tracks(access_token, key)
+        )
+        return tracks[:limit]
+    
+    async def _sync_recent_tracks(self, access_token: str, key: str) -> List[SpotifyTrack]:
+        """Merge plays newer than the stored cursor into the user's history.
+
+        The upstream is polled at most every SPOTIFY_RECENT_TTL seconds.
+        """
+        history = self.recent_history.get(key)
+        if history is not None and time.monotonic() - history.fetched_at < self.recent_ttl:
+            return history.tracks
+        
+        params = {'limit': 50}
+        if history is not None and history.cursor:
+            params['after'] = history.cursor
         
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.get(
-                    f'https://api.spotify.com/v1/me/player/recently-played?limit={limit}',
-                    headers=headers
-                )
+            response = await self._api_get('/me/player/recently-played', access_token, params)
             
             if response.status_code == 200:
                 data = response.json()
+                tracks = []
                 for item in data.get("items", []):
                     track = item["track"]
                     tracks.append(SpotifyTrack(
+                        id=track.get("id"),
                         name=track["name"],
                         artist=track["artists"][0]["name"],
                         played_at=item["played_at"],
                         image=track["album"]["images"][0]["url"] if track["album"]["images"] else None
                     ))
+                if history is None:
+                    history = RecentHistory(self.history_size)
+                history.merge(tracks)
+                self.recent_history.set(key, history)
+        except SpotifyTokenExpired:
+            raise
+        except SpotifyRateLimited:
+            pass
         except Exception as e:
-            print(f"Error fetching recent tracks: {e}")
+            logger.warning("Error fetching recent tracks", extra={"error": str(e)})
+        
+        return history.tracks if history is not None else []
+    
+    async def get_recent_tracks_with_features(self, access_token: str, limit: int = 5, user_key: Optional[str] = None) -> Tuple[List[SpotifyTrack], Dict]:
+        """Recent tracks plus mean valence/energy/tempo over the stored history"""
+        key = user_key or access_token
+        history = await self.single_flight.do(
+            ('recent_tracks', key),
+            lambda: self._sync_recent_tracks(access_token, key)
+        )
+        features = await self.get_audio_features(access_token, [track.id for track in history if track.id])
+        return history[:limit], self.summarize_audio_features(features)
+    
+    async def get_audio_features(self, access_token: str, track_ids: List[str]) -> List[dict]:
+        """Features for each track id, fetched in batches of AUDIO_FEATURES_BATCH for cache misses"""
+        unique_ids = list(dict.fromkeys(track_ids))
+        missing = [track_id for track_id in unique_ids if self.audio_features.get(track_id) is None]
+        
+        for start in range(0, len(missing), AUDIO_FEATURES_BATCH):
+            batch = missing[start:start + AUDIO_FEATURES_BATCH]
+            try:
+                response = await self._api_get('/audio-features', access_token, {'ids': ','.join(batch)})
+                if response.status_code != 200:
+                    logger.warning("Audio features request failed", extra={"status": response.status_code})
+                    break
+                for track_id, features in zip(batch, response.json().get('audio_features', [])):
+                    # Tracks without analysis are cached as empty so they are not re-requested
+                    self.audio_features.set(track_id, features or {})
+            except SpotifyTokenExpired:
+                raise
+            except SpotifyRateLimited:
+                break
+            except Exception as e:
+                logger.warning("Error fetching audio features", extra={"error": str(e)})
+                break
         
-        return tracks
+        return [features for features in (self.audio_features.get(track_id) for track_id in track_ids) if features]
+    
+    @staticmethod
+    def summarize_audio_features(features: List[dict]) -> Dict:
+        if not features:
+            return {}
+        matrix = np.array(
+            [[f.get(name, np.nan) for name in AUDIO_SUMMARY_FIELDS] for f in features],
+            dtype=float
+        )
+        means = np.nanmean(matrix, axis=0)
+        summary = {name: round(float(value), 3) for name, value in zip(AUDIO_SUMMARY_FIELDS, means) if not np.isnan(value)}
+        summary['track_count'] = len(features)
+        return summary
+    
+    def stats(self) -> dict:
+        return {
+            **self.single_flight.stats(),
+            "rate_limited": self.rate_limited,
+            "now_playing_cache": self.now_playing.stats(),
+            "recent_history_cache": self.recent_history.stats(),
+            "audio_features_cache": self.audio_features.stats(),
+        }
+
+spotify_service = SpotifyService(
+    client_id=os.getenv("SPOTIFY_CLIENT_ID"),
+    client_secret=os.getenv("SPOTIFY_CLIENT_SECRET")
+)
@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional, Set
+from services.spotify import SpotifyService, SpotifyTokenExpired, spotify_service
+from services.spotify_tokens import SpotifyTokenStore, spotify_token_store
+
+logger = logging.getLogger(__name__)
+
+# Fields that change every second while playing; sent alongside a change,
+# never a change by themselves (clients interpolate progress locally)
+VOLATILE_FIELDS = ('progress_ms',)
+
+
+class NowPlayingPoller:
+    """Polls one user's now-playing state and fans out changes to subscribers.
+
+    While a track plays, the next poll is scheduled just after it is
+    expected to end, clamped to [min_interval, max_interval] so skips are
+    still noticed. Paused, idle or disconnected users are polled every
+    idle_interval. Each subscriber gets a full snapshot first, then only the
+    keys that changed.
+    """
+
+    def __init__(self, user_id: str, service: SpotifyService, token_store: SpotifyTokenStore,
+                 min_interval: float, max_interval: float, idle_interval: float, queue_size: int):
+        self.user_id = user_id
+        self.service = service
+        self.token_store = token_store
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.idle_interval = idle_interval
+        self.queue_size = queue_size
+        self.state: Optional[Dict[str, Any]] = None
+        self.subscribers: Set[asyncio.Queue] = set()
+        self.task: Optional[asyncio.Task] = None
+        self.polls = 0
+        self.pushes = 0
+
+    def subscribe(self) -> asyncio.Queue:
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        if self.state is not None:
+            queue.put_nowait({"type": "snapshot", **self.state})
+        self.subscribers.add(queue)
+        if self.task is None or self.task.done():
+            self.task = asyncio.ensure_future(self._run())
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self.task is not None:
+            self.task.cancel()
+            self.task = None
+
+    def _publish(self, message: Dict[str, Any]):
+        for queue in self.subscribers:
+            if queue.full():
+                # A slow client missed diffs; resync it with a snapshot
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "snapshot", **self.state})
+            else:
+                queue.put_nowait(message)
+        self.pushes += 1
+
+    async def _poll(self) -> Dict[str, Any]:
+        self.polls += 1
+        token_info = await self.token_store.get_token(self.user_id)
+        if not token_info:
+            return {"connected": False, "track": None, "is_playing": False, "progress_ms": None}
+        try:
+            track = await self.service.get_current_track(token_info['access_token'])
+        except SpotifyTokenExpired:
+            self.token_store.expire(self.user_id)
+            return dict(self.state or {"track": None, "is_playing": False, "progress_ms": None}, connected=True)
+        if track is None:
+            return {"connected": True, "track": None, "is_playing": False, "progress_ms": None}
+        return {
+            "connected": True,
+            "track": track.dict(exclude={'progress_ms', 'is_playing', 'played_at'}),
+            "is_playing": bool(track.is_playing),
+            "progress_ms": track.progress_ms,
+        }
+
+    def _next_interval(self) -> float:
+        if not self.state or not self.state.get("is_playing"):
+            return self.idle_interval
+        track = self.state["track"] or {}
+        if track.get("duration_ms") is None or self.state.get("progress_ms") is None:
+            return self.min_interval
+        remaining = (track["duration_ms"] - self.state["progress_ms"]) / 1000 + 1
+        return min(max(remaining, self.min_interval), self.max_interval)
+
+    async def _run(self):
+        while self.subscribers:
+            try:
+                state = await self._poll()
+            except Exception as e:
+                logger.warning("Error polling now playing", extra={"user_id": self.user_id, "error": str(e)})
+                state = self.state
+            if state is not None:
+                if self.state is None:
+                    self.state = state
+                    self._publish({"type": "snapshot", **state})
+                else:
+                    changes = {
+                        key: value for key, value in state.items()
+                        if key not in VOLATILE_FIELDS and self.state.get(key) != value
+                    }
+                    self.state = state
+                    if changes:
+                        self._publish({"type": "change", **changes, "progress_ms": state["progress_ms"]})
+            await asyncio.sleep(self._next_interval())
+
+
+class NowPlayingHub:
+    """One NowPlayingPoller per connected user, shared by all their connections.
+
+    Users are identified by ``session_user``.
+
+    Intervals come from SPOTIFY_LIVE_MIN_INTERVAL (default 5, the
+    now-playing cache TTL), SPOTIFY_LIVE_MAX_INTERVAL (default 30) and
+    SPOTIFY_LIVE_IDLE_INTERVAL (default 30) seconds.
+    """
+
+    def __init__(self, service: SpotifyService, token_store: SpotifyTokenStore,
+                 min_interval: Optional[float] = None, max_interval: Optional[float] = None,
+                 idle_interval: Optional[float] = None, queue_size: int = 16):
+        self.service = service
+        self.token_store = token_store
+        self.min_interval = min_interval if min_interval is not None else float(os.getenv("SPOTIFY_LIVE_MIN_INTERVAL", "5"))
+        self.max_interval = max_interval if max_interval is not None else float(os.getenv("SPOTIFY_LIVE_MAX_INTERVAL", "30"))
+        self.idle_interval = idle_interval if idle_interval is not None else float(os.getenv("SPOTIFY_LIVE_IDLE_INTERVAL", "30"))
+        self.queue_size = queue_size
+        self.pollers: Dict[str, NowPlayingPoller] = {}
+        # Polls and pushes of pollers already removed, so totals only grow
+        self.retired_polls = 0
+        self.retired_pushes = 0
+
+    def subscribe(self, user_id: str, session_token: Optional[dict] = None) -> asyncio.Queue:
+        # Seed the token store so the poller can refresh without the session
+        self.token_store.get(user_id, session_token)
+        poller = self.pollers.get(user_id)
+        if poller is None:
+            poller = NowPlayingPoller(user_id, self.service, self.token_store, self.min_interval,
+                                      self.max_interval, self.idle_interval, self.queue_size)
+            self.pollers[user_id] = poller
+        return poller.subscribe()
+
+    def unsubscribe(self, user_id: str, queue: asyncio.Queue):
+        poller = self.pollers.get(user_id)
+        if poller is None:
+            return
+        poller.unsubscribe(queue)
+        if not poller.subscribers:
+            del self.pollers[user_id]
+            self.retired_polls += poller.polls
+            self.retired_pushes += poller.pushes
+
+    def stats(self) -> dict:
+        return {
+            "users": len(self.pollers),
+            "subscribers": sum(len(poller.subscribers) for poller in self.pollers.values()),
+            "polls": self.retired_polls + sum(poller.polls for poller in self.pollers.values()),
+            "pushes": self.retired_pushes + sum(poller.pushes for poller in self.pollers.values()),
+        }
+
+
+now_playing_hub = NowPlayingHub(spotify_service, spotify_token_store)
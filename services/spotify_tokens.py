@@ -0,0 +1,120 @@
+import logging
+import os
+import time
+from typing import Optional
+from fastapi import HTTPException
+from database.cache import LRUCache
+from services.single_flight import SingleFlight
+from services.google_auth import user_key
+from services.spotify import SpotifyService, spotify_service
+
+logger = logging.getLogger(__name__)
+
+
+def session_user(session) -> Optional[str]:
+    """Per-user key of a logged-in session, None when logged out.
+
+    Every user's Google credentials carry the app's shared client_id, so
+    Spotify state is keyed by ``user_key`` (derived from the user's own
+    refresh token) instead.
+    """
+    credentials = session.get('credentials')
+    return user_key(credentials) if credentials else None
+
+
+def session_token_key(user: str) -> str:
+    """Session key holding the copy of ``user``'s Spotify token"""
+    return f'spotify_token_{user}'
+
+
+def with_expiry(token_data: dict) -> dict:
+    """Token response plus an absolute ``expires_at`` (epoch seconds)"""
+    token_info = dict(token_data)
+    if 'expires_at' not in token_info:
+        token_info['expires_at'] = int(time.time()) + int(token_info.get('expires_in', 3600))
+    return token_info
+
+
+class SpotifyTokenStore:
+    """Per-user Spotify tokens, refreshed before they expire.
+
+    Tokens are kept in an LRU keyed by ``session_user`` and seeded from the session
+    copy when a worker has not seen the user yet. A token expiring within
+    SPOTIFY_TOKEN_REFRESH_MARGIN seconds (default 60), or one Spotify has
+    answered with 401, is refreshed. Refreshes are single-flight per user.
+    A failed refresh is remembered for SPOTIFY_TOKEN_FAILURE_TTL seconds
+    (default 60), so callers get None straight away instead of retrying
+    the upstream with a stale token.
+    """
+
+    def __init__(self, service: SpotifyService, refresh_margin: Optional[float] = None,
+                 failure_ttl: Optional[float] = None, cache_size: Optional[int] = None):
+        self.service = service
+        self.refresh_margin = refresh_margin if refresh_margin is not None else float(os.getenv("SPOTIFY_TOKEN_REFRESH_MARGIN", "60"))
+        self.tokens = LRUCache(max_size=cache_size if cache_size is not None else int(os.getenv("SPOTIFY_TOKEN_CACHE_SIZE", "10000")))
+        self.failures = LRUCache(
+            max_size=cache_size if cache_size is not None else int(os.getenv("SPOTIFY_TOKEN_CACHE_SIZE", "10000")),
+            ttl=failure_ttl if failure_ttl is not None else float(os.getenv("SPOTIFY_TOKEN_FAILURE_TTL", "60"))
+        )
+        self.single_flight = SingleFlight()
+        self.refreshes = 0
+        self.refresh_failures = 0
+
+    def save(self, user_id: str, token_data: dict) -> dict:
+        token_info = with_expiry(token_data)
+        self.tokens.set(user_id, token_info)
+        self.failures.pop(user_id)
+        return token_info
+
+    def get(self, user_id: str, session_token: Optional[dict] = None) -> Optional[dict]:
+        token_info = self.tokens.get(user_id)
+        if token_info is None and session_token:
+            token_info = self.save(user_id, session_token)
+        return token_info
+
+    def expire(self, user_id: str):
+        """Mark the cached access token as rejected so the next call refreshes it"""
+        self.tokens.update(user_id, lambda token_info: token_info.update(expires_at=0))
+
+    def forget(self, user_id: str):
+        self.tokens.pop(user_id)
+
+    async def get_token(self, user_id: str, session_token: Optional[dict] = None) -> Optional[dict]:
+        """A usable token for ``user_id``, refreshing it if needed; None if disconnected"""
+        token_info = self.get(user_id, session_token)
+        if token_info is None:
+            return None
+        if token_info['expires_at'] - time.time() > self.refresh_margin:
+            return token_info
+        if self.failures.get(user_id) is not None or not token_info.get('refresh_token'):
+            return None
+        try:
+            return await self.single_flight.do(('refresh', user_id), lambda: self._refresh(user_id, token_info))
+        except HTTPException:
+            return None
+
+    async def _refresh(self, user_id: str, token_info: dict) -> dict:
+        try:
+            token_data = await self.service.refresh_access_token(token_info['refresh_token'])
+        except Exception as e:
+            self.refresh_failures += 1
+            self.failures.set(user_id, True)
+            logger.warning("Failed to refresh Spotify token", extra={"user_id": user_id, "error": str(e)})
+            raise HTTPException(status_code=401, detail="Failed to refresh Spotify token")
+
+        # Spotify may omit the refresh token when it is not rotated
+        token_data.setdefault('refresh_token', token_info['refresh_token'])
+        token_data.pop('expires_at', None)
+        self.refreshes += 1
+        return self.save(user_id, token_data)
+
+    def stats(self) -> dict:
+        return {
+            **self.single_flight.stats(),
+            "refreshes": self.refreshes,
+            "refresh_failures": self.refresh_failures,
+            "cached_users": len(self.tokens),
+        }
+
+
+spotify_token_store = SpotifyTokenStore(spotify_service)
@@ -0,0 +1,46 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import time
+from typing import Dict, Optional
+
+# HS256 only; the key comes from JWT_SECRET_KEY, falling back to the session secret
+SECRET_KEY = (os.getenv("JWT_SECRET_KEY") or os.getenv("FLASK_SECRET_KEY", "super-secret-key-123")).encode()
+_HEADER = base64.urlsafe_b64encode(b'{"alg":"HS256","typ":"JWT"}').rstrip(b'=')
+
+
+def _b64encode(data: bytes) -> bytes:
+    return base64.urlsafe_b64encode(data).rstrip(b'=')
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))
+
+
+def _sign(signing_input: bytes) -> bytes:
+    return _b64encode(hmac.new(SECRET_KEY, signing_input, hashlib.sha256).digest())
+
+
+def create_jwt(payload: Dict) -> str:
+    signing_input = _HEADER + b'.' + _b64encode(json.dumps(payload, separators=(',', ':')).encode())
+    return (signing_input + b'.' + _sign(signing_input)).decode()
+
+
+def verify_jwt(token: Optional[str]) -> Optional[Dict]:
+    """The payload of a token signed with SECRET_KEY; None if malformed, forged or past ``exp``"""
+    if not token:
+        return None
+    try:
+        header, payload, signature = token.encode().split(b'.')
+        if not hmac.compare_digest(_sign(header + b'.' + payload), signature):
+            return None
+        if json.loads(_b64decode(header.decode())).get('alg') != 'HS256':
+            return None
+        data = json.loads(_b64decode(payload.decode()))
+    except ValueError:
+        return None
+    if 'exp' in data and data['exp'] < time.time():
+        return None
+    return data